@@ -105,5 +105,6 @@ class Board:
         new_board._place_pieces()
         return new_board
 
-board = Board()
-board.display()
\ No newline at end of file
+if __name__ == "__main__":
+    board = Board()
+    board.display()
\ No newline at end of file
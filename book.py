@@ -0,0 +1,229 @@
+# book.py
+"""
+Livro de aberturas: jogadas já calculadas para as primeiras posições do jogo.
+
+O jogo começa sempre na mesma posição (piece.get_pieces()), por isso as
+primeiras jogadas da pesquisa são sempre iguais. O livro guarda, para cada
+posição (chave de Zobrist, que inclui o lado a jogar), uma ou mais jogadas com
+um peso; o AI escolhe entre elas ao acaso, proporcionalmente ao peso, sem
+pesquisar.
+
+Formato do ficheiro (little-endian):
+    "JOB1", número de entradas (uint32)
+    entradas de 12 bytes (chave uint64, jogada uint16, peso uint16),
+    ordenadas pela chave
+A consulta é uma pesquisa binária sobre o ficheiro aberto com mmap.
+
+O BookBuilder junta resultados de duas fontes:
+    - pesquisas profundas de todas as posições até N plies do início
+    - jogos entre motores (tournament.py): contam as jogadas do vencedor e,
+      com metade do peso, as dos empates
+
+Exemplos:
+    python book.py build --plies 3 --depth 8
+    python book.py build --games 20 --engine mcts:iters=3000 --merge book.bin
+    python book.py show
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+from position import Position, move_to_text, from_notation, square, SIDES
+from transposition import encode_move, decode_move
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+MAGIC = b"JOB1"
+HEADER = struct.Struct("<4sI")
+ENTRY = struct.Struct("<QHH")
+MAX_WEIGHT = 0xFFFF
+
+# Pesos de cada fonte
+SEARCH_WEIGHT = 4  # melhor jogada de uma pesquisa profunda
+WIN_WEIGHT = 2     # jogada do vencedor de um jogo
+DRAW_WEIGHT = 1    # jogada de um jogo empatado
+
+
+class OpeningBook:
+    """Consulta de um ficheiro do livro (aberto com mmap)."""
+
+    def __init__(self, path=BOOK_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.count * ENTRY.size:
+            self.data.close()
+            raise ValueError(f"Ficheiro do livro inválido: {path}")
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i):
+        return ENTRY.unpack_from(self.data, HEADER.size + i * ENTRY.size)[0]
+
+    def entries(self, key):
+        """Jogadas e pesos guardados para a chave: [(jogada, peso)]."""
+        self.probes += 1
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        while lo < self.count:
+            entry_key, move, weight = ENTRY.unpack_from(self.data, HEADER.size + lo * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((decode_move(move), weight))
+            lo += 1
+        if result:
+            self.hits += 1
+        return result
+
+    def choose(self, pos, rng=random):
+        """
+        Jogada do livro para `pos`, escolhida ao acaso com os pesos, ou None.
+        As jogadas que não são legais na posição (colisão de chaves) são ignoradas.
+        """
+        entries = self.entries(pos.hash)
+        if not entries:
+            return None
+        legal = pos.legal_moves()
+        entries = [(move, weight) for move, weight in entries if move in legal and weight > 0]
+        if not entries:
+            return None
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+    def close(self):
+        self.data.close()
+
+
+def open_book(path=BOOK_PATH):
+    """Livro do ficheiro, ou None se o ficheiro não existir."""
+    if not path or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+class BookBuilder:
+    def __init__(self):
+        self.entries = {}  # chave -> {jogada: peso}
+
+    def add(self, pos, move, weight=1):
+        moves = self.entries.setdefault(pos.hash, {})
+        moves[move] = min(MAX_WEIGHT, moves.get(move, 0) + weight)
+
+    def load(self, path):
+        """Junta as entradas de um livro já existente."""
+        book = OpeningBook(path)
+        for i in range(book.count):
+            key, move, weight = ENTRY.unpack_from(book.data, HEADER.size + i * ENTRY.size)
+            moves = self.entries.setdefault(key, {})
+            move = decode_move(move)
+            moves[move] = min(MAX_WEIGHT, moves.get(move, 0) + weight)
+        book.close()
+
+    def add_game(self, moves, winner, plies):
+        """Jogadas das primeiras `plies` plies de um jogo (a partir da posição inicial)."""
+        pos = Position()
+        for move in moves[:plies]:
+            if winner is None:
+                self.add(pos, move, DRAW_WEIGHT)
+            elif winner == pos.side:
+                self.add(pos, move, WIN_WEIGHT)
+            pos.make_move(move)
+
+    def add_self_play(self, engine, games, plies, workers=1, seed=0, verbose=True):
+        """Joga `games` jogos do motor (especificação de tournament.py) contra si próprio."""
+        from tournament import parse_engine, run_tournament
+        config = parse_engine(engine)
+        for result in run_tournament(config, config, games, workers, seed):
+            self.add_game(result["moves"], result["winner"], plies)
+            if verbose:
+                print(f"  jogo: vencedor {result['winner']}, {result['plies']} plies ({result['reason']})")
+
+    def add_searches(self, plies, depth, verbose=True):
+        """Pesquisa (get_move_hard, sem livro) todas as posições a menos de `plies` plies do início."""
+        from minimax import AI
+        from rules import Rules
+        ai = AI(verbose=False, book=None)
+        frontier = [Position()]
+        seen = set()
+        for ply in range(plies):
+            following = []
+            for pos in frontier:
+                if pos.hash in seen:
+                    continue
+                seen.add(pos.hash)
+                board = pos.to_board()
+                start = time.time()
+                board_move = ai.get_move_hard(board, Rules(board), SIDES[pos.side], depth=depth)
+                if board_move is None:
+                    continue
+                move = (square(*board_move[0].position), square(*board_move[1]))
+                self.add(pos, move, SEARCH_WEIGHT)
+                if verbose:
+                    print(f"  ply {ply}: {move_to_text(move)} "
+                          f"(score {ai.last_stats.score}, {time.time() - start:.1f}s)")
+                for reply in pos.legal_moves():
+                    child = pos.copy()
+                    child.make_move(reply)
+                    if child.winner() is None:
+                        following.append(child)
+            frontier = following
+
+    def write(self, path):
+        records = sorted((key, encode_move(move), weight)
+                         for key, moves in self.entries.items() for move, weight in moves.items())
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records)))
+            for record in records:
+                f.write(ENTRY.pack(*record))
+        return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Livro de aberturas.")
+    parser.add_argument("command", choices=("build", "show"))
+    parser.add_argument("position", nargs="?", help="posição para 'show' (por omissão a inicial)")
+    parser.add_argument("--output", default=BOOK_PATH, help="ficheiro do livro")
+    parser.add_argument("--plies", type=int, default=3, help="pesquisar as posições até esta ply")
+    parser.add_argument("--depth", type=int, default=8, help="profundidade dessas pesquisas")
+    parser.add_argument("--games", type=int, default=0, help="jogos de auto-jogo a juntar")
+    parser.add_argument("--engine", default="mcts:iters=3000", help="motor do auto-jogo (ver tournament.py)")
+    parser.add_argument("--game-plies", type=int, default=12, help="plies de cada jogo que entram no livro")
+    parser.add_argument("--workers", type=int, default=1, help="processos para os jogos")
+    parser.add_argument("--merge", help="livro existente cujas entradas são mantidas")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        book = OpeningBook(args.output)
+        pos = from_notation(args.position) if args.position else Position()
+        entries = book.entries(pos.hash)
+        total = sum(weight for _, weight in entries) or 1
+        print(f"{len(book)} entradas no livro; {len(entries)} jogadas para esta posição")
+        for move, weight in sorted(entries, key=lambda e: -e[1]):
+            print(f"  {move_to_text(move)}  peso {weight} ({weight / total:.0%})")
+        return
+
+    builder = BookBuilder()
+    if args.merge:
+        builder.load(args.merge)
+    start = time.time()
+    if args.plies:
+        builder.add_searches(args.plies, args.depth)
+    if args.games:
+        builder.add_self_play(args.engine, args.games, args.game_plies, args.workers)
+    count = builder.write(args.output)
+    print(f"{count} entradas ({len(builder.entries)} posições) em {args.output}, {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
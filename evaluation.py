@@ -0,0 +1,222 @@
+# evaluation.py
+"""
+Avaliação incremental para a pesquisa da IA.
+
+IncrementalPosition é uma Position que guarda, além das peças, as jogadas de
+cada peça, o número de peças de cada lado que atacam cada casa (mapa de
+ataques), a mobilidade e a proximidade à toca adversária de cada lado. Estes
+dados são atualizados em make_move/unmake_move: uma jogada de `frm` para `to`
+só muda as jogadas das peças cujos destinos (ou saltos sobre o rio) passam por
+uma dessas duas casas, e são só essas que se voltam a gerar. A avaliação de uma
+folha passa a ser uma soma sobre as 16 peças, sem gerar jogadas, e
+legal_moves devolve as jogadas já guardadas.
+
+Os termos são os mesmos de AI.complex_evaluate_side (que continua a ser a
+versão de referência para uma Position normal), mas contados em décimas
+inteiras para que as atualizações incrementais não acumulem erros de
+arredondamento.
+
+STATIC_TABLE dá o valor estático de cada peça em cada casa (só material,
+armadilhas e proximidade à toca); static_deltas usa-a para avaliar de uma vez
+todos os filhos de um nó da fronteira, calculando só a diferença que cada
+jogada faz (a pesquisa usa-os na futility pruning e, com use_static_order, para
+ordenar as jogadas calmas desses nós).
+"""
+from position import (Position, NUM_SQUARES, NUM_PIECES, YELLOW, MAGENTA, RANKS, LION, TIGER, RAT,
+                      COLS, DEN_SQUARE, SIDE_TRAPS, RAT_TARGETS, JUMP_TARGETS, TERRAIN, TRAP)
+
+# Valor de cada peça na complex_evaluate_side (rank + bónus de Lion/Tiger/Rat)
+PIECE_VALUES = tuple(RANKS[kind] + (5 if kind in (LION, TIGER) else 6 if kind == RAT else 0)
+                     for kind in range(8))
+
+# Os mesmos termos em décimas: peça, jogada disponível (0.5), controlo das
+# armadilhas adversárias (5) e proximidade à toca (0.2 por casa a menos de 10)
+PIECE_TENTHS = tuple(value * 10 for value in PIECE_VALUES)
+MOBILITY_TENTHS = 5
+TRAP_CONTROL_TENTHS = 50
+
+
+def _den_distance(sq, side):
+    den = DEN_SQUARE[1 - side]
+    return abs(den // COLS - sq // COLS) + abs(den % COLS - sq % COLS)
+
+
+# DEN_DISTANCE[side][sq]: distância de Manhattan até à toca adversária de `side`
+DEN_DISTANCE = tuple(tuple(_den_distance(sq, side) for sq in range(NUM_SQUARES)) for side in (YELLOW, MAGENTA))
+PROXIMITY_TENTHS = tuple(tuple(max(0, 10 - d) * 2 for d in distances) for distances in DEN_DISTANCE)
+
+
+def _build_dependents():
+    """
+    DEPENDENTS[s]: casas de onde as jogadas de uma peça dependem do que está em
+    `s` (vizinhas de `s`, e origens de saltos que atravessam ou aterram em `s`).
+    """
+    dependents = [set() for _ in range(NUM_SQUARES)]
+    for side in (YELLOW, MAGENTA):
+        for t in range(NUM_SQUARES):
+            for to in RAT_TARGETS[side][t]:
+                dependents[to].add(t)
+            for to, crossed in JUMP_TARGETS[side][t]:
+                dependents[to].add(t)
+                for sq in crossed:
+                    dependents[sq].add(t)
+    return tuple(frozenset(d) for d in dependents)
+
+
+DEPENDENTS = _build_dependents()
+
+
+def _build_static_table():
+    """
+    STATIC_TABLE[p][casa]: valor da peça p nessa casa, em décimas e do ponto de
+    vista do YELLOW (material, metade numa armadilha, proximidade à toca).
+    """
+    table = []
+    for p in range(NUM_PIECES):
+        side = p >> 3
+        sign = 1 if side == YELLOW else -1
+        row = []
+        for sq in range(NUM_SQUARES):
+            value = PIECE_TENTHS[p & 7]
+            if TERRAIN[sq] == TRAP:
+                value //= 2  # numa armadilha qualquer peça pode ser capturada
+            row.append(sign * (value + PROXIMITY_TENTHS[side][sq]))
+        table.append(tuple(row))
+    return tuple(table)
+
+
+STATIC_TABLE = _build_static_table()
+
+
+def static_deltas(pos, moves):
+    """
+    Variação do valor estático (STATIC_TABLE) que cada jogada provoca, do
+    ponto de vista do lado a jogar: {jogada: variação}. Para os 10 a 30 filhos
+    de um nó é cerca de dez vezes mais rápido em Python puro do que empilhar os
+    filhos em arrays do numpy.
+    """
+    board = pos.board
+    table = STATIC_TABLE
+    sign = 1 if pos.side == YELLOW else -1
+    deltas = {}
+    for move in moves:
+        frm, to = move
+        row = table[board[frm]]
+        victim = board[to]
+        delta = row[to] - row[frm]
+        if victim >= 0:
+            delta -= table[victim][to]
+        deltas[move] = sign * delta / 10
+    return deltas
+
+
+class IncrementalPosition(Position):
+    __slots__ = ("moves", "attacks", "mobility", "proximity")
+
+    def __init__(self, squares, side=YELLOW):
+        super().__init__(squares, side)
+        self.moves = [[] for _ in range(NUM_PIECES)]
+        self.attacks = [0] * (2 * NUM_SQUARES)  # side * NUM_SQUARES + casa
+        self.mobility = [0, 0]
+        self.proximity = [0, 0]
+        for p in range(NUM_PIECES):
+            self._refresh(p, [])
+            if self.squares[p] >= 0:
+                self.proximity[p >> 3] += PROXIMITY_TENTHS[p >> 3][self.squares[p]]
+
+    @classmethod
+    def from_position(cls, pos):
+        return pos.copy() if isinstance(pos, cls) else cls(pos.squares, pos.side)
+
+    def copy(self):
+        new = IncrementalPosition.__new__(IncrementalPosition)
+        new.squares = self.squares[:]
+        new.board = self.board[:]
+        new.side = self.side
+        new.hash = self.hash
+        new.moves = self.moves[:]  # as listas não são alteradas, só substituídas
+        new.attacks = self.attacks[:]
+        new.mobility = self.mobility[:]
+        new.proximity = self.proximity[:]
+        return new
+
+    def _refresh(self, p, undo):
+        """Volta a gerar as jogadas da peça p e atualiza o mapa de ataques."""
+        old = self.moves[p]
+        new = []
+        self._add_moves(p, new)
+        if new == old:
+            return
+        attacks = self.attacks
+        base = (p >> 3) * NUM_SQUARES
+        for _, to in old:
+            attacks[base + to] -= 1
+        for _, to in new:
+            attacks[base + to] += 1
+        self.mobility[p >> 3] += len(new) - len(old)
+        self.moves[p] = new
+        undo.append((p, old))
+
+    def piece_moves(self, p):
+        return self.moves[p][:]
+
+    def legal_moves(self, side=None):
+        if side is None:
+            side = self.side
+        moves = []
+        for piece_moves in self.moves[side * 8:side * 8 + 8]:
+            moves += piece_moves
+        return moves
+
+    def make_move(self, move):
+        frm, to = move
+        p = self.board[frm]
+        side = p >> 3
+        proximity = self.proximity[:]
+        token = Position.make_move(self, move)
+        victim = token[2]
+        undo = []
+        self.proximity[side] += PROXIMITY_TENTHS[side][to] - PROXIMITY_TENTHS[side][frm]
+        if victim >= 0:
+            self.proximity[victim >> 3] -= PROXIMITY_TENTHS[victim >> 3][to]
+            self._refresh(victim, undo)
+        self._refresh(p, undo)
+        board = self.board
+        for sq in DEPENDENTS[frm] | DEPENDENTS[to]:
+            q = board[sq]
+            if q >= 0 and q != p:
+                self._refresh(q, undo)
+        return token, undo, proximity
+
+    def unmake_move(self, token):
+        token, undo, proximity = token
+        Position.unmake_move(self, token)
+        attacks = self.attacks
+        moves = self.moves
+        for p, old in reversed(undo):
+            current = moves[p]
+            base = (p >> 3) * NUM_SQUARES
+            for _, to in current:
+                attacks[base + to] -= 1
+            for _, to in old:
+                attacks[base + to] += 1
+            self.mobility[p >> 3] += len(old) - len(current)
+            moves[p] = old
+        self.proximity = proximity
+
+    def evaluate_side(self, side):
+        """Mesmo valor de AI.complex_evaluate_side, sem gerar jogadas."""
+        attacks = self.attacks
+        squares = self.squares
+        moves = self.moves
+        score = self.mobility[side] * MOBILITY_TENTHS + self.proximity[side]
+        for p in range(side * 8, side * 8 + 8):
+            if squares[p] >= 0:
+                # Uma peça "under_attack" vale metade
+                score += PIECE_TENTHS[p & 7] // 2 if self.threatened(p, moves[p]) else PIECE_TENTHS[p & 7]
+        own = side * NUM_SQUARES
+        for sq in SIDE_TRAPS[1 - side]:
+            if attacks[own + sq]:
+                score += TRAP_CONTROL_TENTHS
+                break
+        return score / 10
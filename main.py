@@ -18,6 +18,52 @@ def format_position(pos):
     return (row, ascii_uppercase[col - 1])
 
 
+def get_ai_move(ai, dificuldade, hard_type, board, rules, color):
+    """Chama o método da IA correspondente à dificuldade escolhida."""
+    if dificuldade == "easy":
+        return ai.get_move_easy(board, rules, color)
+    if dificuldade == "medium":
+        return ai.get_move_medium(board, rules, color)
+    if dificuldade == "mcts":
+        return ai.get_move_mcts(board, rules, color)
+    if hard_type == "iterative":
+        return ai.get_move_hard_iterative(board, rules, color, time_limit=10)
+    return ai.get_move_hard(board, rules, color)
+
+
+def choose_difficulty():
+    """Pergunta a dificuldade (e, para 'hard', a implementação). Devolve (dificuldade, hard_type)."""
+    print("1 - Fácil")
+    print("2 - Médio")
+    print("3 - Difícil")
+    print("4 - MCTS")
+    dificuldade_input = input("Opção: ")
+    hard_type = "standard"
+
+    if dificuldade_input == "1":
+        dificuldade = "easy"
+    elif dificuldade_input == "2":
+        dificuldade = "medium"
+    elif dificuldade_input == "3":
+        dificuldade = "hard"
+        print("Escolha a implementação para 'hard':")
+        print("1 - Hard sem iterative deepening")
+        print("2 - Hard com iterative deepening")
+        hard_opcao = input("Opção: ")
+        if hard_opcao == "1":
+            hard_type = "standard"
+        elif hard_opcao == "2":
+            hard_type = "iterative"
+        else:
+            print("Opção inválida, usando Hard sem iterative deepening por padrão.")
+    elif dificuldade_input == "4":
+        dificuldade = "mcts"
+    else:
+        print("Dificuldade inválida. Selecionando 'Fácil' por padrão.")
+        dificuldade = "easy"
+    return dificuldade, hard_type
+
+
 def find_piece_by_position(board, position, player):
     for piece in board.pieces[player]:
         if piece.position == position and piece.state != "Dead":
@@ -81,7 +127,7 @@ def run_pvp_game(board, rules, player_keys): # Lógica do Jogador vs Jogador
             continue
 
 
-def run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade, hard_type):
+def run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade, hard_type, ponder=False):
     print("Modo Jogador vs IA iniciado!")
     # Vamos assumir que o Player1 é o humano e o player2 é a IA.
     current_player = "Player1"
@@ -129,16 +175,7 @@ def run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade,
             Chama o método da IA para calcular o movimento.
             É importante que o método da IA considere apenas as peças da IA.
             """
-            if dificuldade == "easy":
-                move = ai.get_move_easy(board, rules, player_keys[current_player])
-            elif dificuldade == "medium":
-                move = ai.get_move_medium(board, rules, player_keys[current_player])
-            elif dificuldade == "hard":
-                if dificuldade == "hard":
-                    if hard_type == "standard":
-                        move = ai.get_move_hard(board, rules, player_keys[current_player])
-                    elif hard_type == "iterative":
-                        move = ai.get_move_hard_iterative(board, rules, player_keys[current_player], time_limit=10)
+            move = get_ai_move(ai, dificuldade, hard_type, board, rules, player_keys[current_player])
 
             if move is None:
                 print("A IA não tem movimentos disponíveis!")
@@ -160,7 +197,12 @@ def run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade,
         if rules.check_victory():
             break
 
+        if ponder and current_player != "Player1":
+            # Enquanto o jogador pensa, a IA vai pesquisando a resposta prevista
+            ai.start_pondering(board, player_keys[current_player])
+
         current_player, opponent = opponent, current_player
+    ai.stop_pondering()
 
 def run_aivai_game(board, rules, player_keys, ai1, ai2 , dificuldadep1,dificuldadep2, hard_type):
     print("Modo IA vs IA iniciado!")
@@ -186,16 +228,7 @@ def run_aivai_game(board, rules, player_keys, ai1, ai2 , dificuldadep1,dificulda
 
         if current_player == "Player1":
             print("Turno do Amarelo:")
-            if dificuldadep1=="easy":
-                move = ai1.get_move_easy(board, rules, player_keys[current_player])
-            elif dificuldadep1=="medium":
-                move=ai1.get_move_medium(board,rules,player_keys[current_player])
-            elif dificuldadep1 == "hard":
-                if dificuldadep1 == "hard":
-                    if hard_type == "standard":
-                        move = ai1.get_move_hard(board, rules, player_keys[current_player])
-                    elif hard_type == "iterative":
-                        move = ai1.get_move_hard_iterative(board, rules, player_keys[current_player], time_limit=10)
+            move = get_ai_move(ai1, dificuldadep1, hard_type, board, rules, player_keys[current_player])
 
             if move is None:
                 print("O Amarelo não tem movimentos disponíveis!")
@@ -210,16 +243,7 @@ def run_aivai_game(board, rules, player_keys, ai1, ai2 , dificuldadep1,dificulda
             Chama o método da IA para calcular o movimento.
             É importante que o método da IA considere apenas as peças da IA.
             """
-            if dificuldadep2=="easy":
-                move = ai2.get_move_easy(board, rules, player_keys[current_player])
-            elif dificuldadep2=="medium":
-                move=ai2.get_move_medium(board,rules,player_keys[current_player])
-            elif dificuldadep2 == "hard":
-                if dificuldadep2 == "hard":
-                    if hard_type == "standard":
-                        move = ai2.get_move_hard(board, rules, player_keys[current_player])
-                    elif hard_type == "iterative":
-                        move = ai2.get_move_hard_iterative(board, rules, player_keys[current_player], time_limit=10)
+            move = get_ai_move(ai2, dificuldadep2, hard_type, board, rules, player_keys[current_player])
 
             if move is None:
                 print("O Magenta não tem movimentos disponíveis!")
@@ -269,24 +293,14 @@ def main():
     elif modo == "2":
         print("Modo Jogador vs IA selecionado.")
         print("Escolhe a dificuldade da IA:")
-        print("1 - Fácil")
-        print("2 - Médio")
-        print("3 - Difícil")
-
-        dificuldade_input = input("Opção: ")
-
-        if dificuldade_input == "1":
-            dificuldade = "easy"
-        elif dificuldade_input == "2":
-            dificuldade = "medium"
-        elif dificuldade_input == "3":
-            dificuldade = "hard"
-        else:
-            print("Dificuldade inválida. Selecionando 'Fácil' por padrão.")
-            dificuldade = "easy"
+        dificuldade, hard_type = choose_difficulty()
 
         ai = AI()
         print(f"IA de dificuldade {dificuldade} selecionada.")
+        ponder = False
+        if dificuldade == "hard":
+            ponder = input("A IA pensa durante a tua vez? (s/n): ").strip().lower() == "s"
+
         print("Escolhe com qual cor quer jogar:")
         print("1. Amarelo")
         print("2. Magenta")
@@ -315,64 +329,16 @@ def main():
         # Isto já era feito antes, mas pode ser útil para termos acesso direto dentro da lógica da IA.
         board.opponent_color = board.human_color
 
-        run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade)
+        run_pvai_game(board, rules, player_keys, hplayer, aiplayer, ai, dificuldade, hard_type, ponder)
 
     elif modo == "3":
         print("Modo de Ai vs Ai selecionado.")
-        hard_type = "standard"
         print("Escolhe a dificuldade do Amarelo:")
-        print("1 - Fácil")
-        print("2 - Médio")
-        print("3 - Difícil")
-        dificuldade_input = input("Opção: ")
-
-        if dificuldade_input == "1":
-            dificuldade1 = "easy"
-        elif dificuldade_input == "2":
-            dificuldade1 = "medium"
-        elif dificuldade_input == "3":
-            dificuldade1 = "hard"
-            print("Escolha a implementação para 'hard':")
-            print("1 - Hard sem iterative deepening")
-            print("2 - Hard com iterative deepening")
-            hard_opcao = input("Opção: ")
-            if hard_opcao == "1":
-                hard_type = "standard"
-            elif hard_opcao == "2":
-                hard_type = "iterative"
-            else:
-                print("Opção inválida, usando Hard sem iterative deepening por padrão.")
-                hard_type = "standard"
-        else:
-            print("Dificuldade inválida. Selecionando 'Fácil' por padrão.")
-            dificuldade1 = "easy"
-
+        dificuldade1, hard_type1 = choose_difficulty()
         print("Escolhe a dificuldade do Magenta:")
-        print("1 - Fácil")
-        print("2 - Médio")
-        print("3 - Difícil")
-        dificuldade_input = input("Opção: ")
-
-        if dificuldade_input == "1":
-            dificuldade2 = "easy"
-        elif dificuldade_input == "2":
-            dificuldade2 = "medium"
-        elif dificuldade_input == "3":
-            dificuldade2 = "hard"
-            print("Escolha a implementação para 'hard':")
-            print("1 - Hard sem iterative deepening")
-            print("2 - Hard com iterative deepening")
-            hard_opcao = input("Opção: ")
-            if hard_opcao == "1":
-                hard_type = "standard"
-            elif hard_opcao == "2":
-                hard_type = "iterative"
-            else:
-                print("Opção inválida, usando Hard sem iterative deepening por padrão.")
-                hard_type = "standard"
-        else:
-            print("Dificuldade inválida. Selecionando 'Fácil' por padrão.")
-            dificuldade2 = "easy"
+        dificuldade2, hard_type2 = choose_difficulty()
+        # As duas IAs partilham a implementação de 'hard' (fica a última escolhida)
+        hard_type = hard_type2 if dificuldade2 == "hard" else hard_type1
 
         ai1 = AI()
         print(f"Dificuldade {dificuldade1} selecionada para o Amarelo.")
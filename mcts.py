@@ -0,0 +1,223 @@
+# mcts.py
+"""
+Monte Carlo Tree Search (UCT) sobre a Position, como alternativa ao minimax.
+
+Cada iteração:
+    1. seleção: desce pela árvore escolhendo o filho com maior UCT
+           vitórias / visitas + C * sqrt(ln(visitas do pai) / visitas)
+    2. expansão: acrescenta um filho ainda não experimentado
+    3. simulação (rollout): joga até ao fim com jogadas aleatórias, ligeiramente
+       enviesadas (entra na toca se puder e prefere capturas); ao fim de
+       ROLLOUT_MAX_PLIES decide pelo material
+    4. retropropagação: soma o resultado (1 vitória, 0.5 empate, 0 derrota) em
+       cada nó, do ponto de vista do lado que fez a jogada desse nó
+
+A árvore é mantida entre jogadas: se a nova posição for um filho ou neto da
+raiz anterior (a nossa jogada e a resposta do adversário), a pesquisa continua
+a partir dessa subárvore.
+"""
+import math
+import random
+import time
+
+from position import DEN_SQUARE, RANKS
+
+EXPLORATION = 1.4          # constante C do UCT
+ROLLOUT_MAX_PLIES = 80     # a partir daqui o rollout é decidido pelo material
+ROLLOUT_CAPTURE_BIAS = 0.5  # probabilidade de escolher uma captura quando há capturas
+TIME_CHECK_EVERY = 16      # iterações entre verificações do relógio
+
+
+class Node:
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins", "side", "hash", "winner")
+
+    def __init__(self, move, parent, pos):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.side = 1 - pos.side  # lado que fez a jogada que levou a este nó
+        self.hash = pos.hash
+        self.winner = pos.winner()
+        if self.winner is None:
+            self.untried = pos.legal_moves()
+            random.shuffle(self.untried)
+            if not self.untried:
+                self.winner = 1 - pos.side  # sem jogadas: perde por imobilização
+        else:
+            self.untried = []
+
+    def best_child(self, exploration):
+        log_visits = math.log(self.visits)
+        best, best_value = None, -1.0
+        for child in self.children:
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def most_visited(self):
+        return max(self.children, key=lambda child: child.visits) if self.children else None
+
+
+def material_winner(pos):
+    """Lado com mais material (soma dos ranks das peças vivas), ou None se for igual."""
+    score = 0
+    for p, sq in enumerate(pos.squares):
+        if sq >= 0:
+            score += RANKS[p & 7] if p < 8 else -RANKS[p & 7]
+    if score == 0:
+        return None
+    return 0 if score > 0 else 1
+
+
+def rollout(pos, max_plies=ROLLOUT_MAX_PLIES, capture_bias=ROLLOUT_CAPTURE_BIAS):
+    """Joga a posição até ao fim (altera `pos`). Devolve o lado vencedor ou None (empate)."""
+    rng = random.random
+    choice = random.choice
+    for _ in range(max_plies):
+        winner = pos.winner()
+        if winner is not None:
+            return winner
+        moves = pos.legal_moves()
+        if not moves:
+            return 1 - pos.side
+        board = pos.board
+        target_den = DEN_SQUARE[1 - pos.side]
+        move = None
+        captures = []
+        for m in moves:
+            if m[1] == target_den:
+                move = m
+                break
+            if board[m[1]] >= 0:
+                captures.append(m)
+        if move is None:
+            move = choice(captures) if captures and rng() < capture_bias else choice(moves)
+        pos.make_move(move)
+    winner = pos.winner()
+    return winner if winner is not None else material_winner(pos)
+
+
+class MCTS:
+    def __init__(self, exploration=EXPLORATION, rollout_plies=ROLLOUT_MAX_PLIES):
+        self.exploration = exploration
+        self.rollout_plies = rollout_plies
+        self.root = None
+        self.iterations = 0  # iterações da última pesquisa
+        self.max_depth = 0   # profundidade máxima atingida na árvore
+        self.reused = 0      # visitas herdadas da jogada anterior
+
+    def _find_root(self, pos):
+        """Reaproveita a subárvore da posição `pos`, se for a raiz, um filho ou um neto."""
+        root = self.root
+        if root is not None:
+            if root.hash == pos.hash:
+                return root
+            for child in root.children:
+                if child.hash == pos.hash:
+                    return child
+                for grandchild in child.children:
+                    if grandchild.hash == pos.hash:
+                        return grandchild
+        return Node(None, None, pos)
+
+    def set_root(self, pos):
+        """Define a raiz da pesquisa (reaproveitando a árvore anterior, se possível)."""
+        root = self._find_root(pos)
+        root.parent = None
+        root.move = None
+        self.root = root
+        self.reused = root.visits
+        self.iterations = 0
+        self.max_depth = 0
+        return root
+
+    def select(self, pos, virtual_loss=False):
+        """
+        Seleção e expansão a partir da raiz (`pos` é a posição da raiz). Devolve
+        o nó escolhido e a sua posição. Com virtual_loss cada nó do caminho
+        recebe já uma visita sem vitória, para que as seleções seguintes (antes
+        de os resultados chegarem) escolham outros caminhos; nesse caso a
+        retropropagação é feita com counted=True.
+        """
+        node = self.root
+        current = pos.copy()
+        depth = 0
+        exploration = self.exploration
+        if virtual_loss:
+            node.visits += 1
+        while not node.untried and node.children:
+            node = node.best_child(exploration)
+            current.make_move(node.move)
+            depth += 1
+            if virtual_loss:
+                node.visits += 1
+        if node.untried:
+            move = node.untried.pop()
+            current.make_move(move)
+            child = Node(move, node, current)
+            node.children.append(child)
+            node = child
+            depth += 1
+            if virtual_loss:
+                node.visits += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return node, current
+
+    def backpropagate(self, node, winner, counted=False):
+        """Soma o resultado de um rollout em `node` e nos antepassados."""
+        while node is not None:
+            if not counted:
+                node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.side:
+                node.wins += 1.0
+            node = node.parent
+
+    def search(self, pos, iterations=None, time_limit=None):
+        """
+        Corre o MCTS a partir de `pos` até esgotar as iterações ou o tempo (pelo
+        menos um dos dois tem de ser dado). Devolve a jogada mais visitada.
+        """
+        if iterations is None and time_limit is None:
+            raise ValueError("É preciso um limite de iterações ou de tempo")
+        root = self.set_root(pos)
+        if not root.untried and not root.children:
+            return None
+        start = time.time()
+        while True:
+            if iterations is not None and self.iterations >= iterations:
+                break
+            if (time_limit is not None and self.iterations % TIME_CHECK_EVERY == 0
+                    and time.time() - start >= time_limit):
+                break
+            self.iterations += 1
+            node, current = self.select(pos)
+            winner = node.winner
+            if winner is None:
+                winner = rollout(current, self.rollout_plies)
+            self.backpropagate(node, winner)
+        best = self.root.most_visited()
+        return best.move if best is not None else None
+
+    def root_statistics(self):
+        """Visitas e vitórias de cada jogada da raiz: [(jogada, visitas, vitórias)]."""
+        return [(child.move, child.visits, child.wins) for child in self.root.children]
+
+    def principal_variation(self, max_length=10):
+        """Sequência das jogadas mais visitadas a partir da raiz."""
+        pv = []
+        node = self.root
+        while node is not None and node.children and len(pv) < max_length:
+            node = node.most_visited()
+            pv.append(node.move)
+        return pv
+
+    def root_win_rate(self):
+        """Taxa de vitórias da jogada mais visitada (do ponto de vista de quem joga na raiz)."""
+        best = self.root.most_visited() if self.root is not None else None
+        return best.wins / best.visits if best is not None and best.visits else None
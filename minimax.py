@@ -1,283 +1,965 @@
 import random
-import numpy
-from board import Board
-from piece import get_pieces
+from position import (Position, to_board_move, move_to_text, square, SIDES, RANKS, DEN_SQUARE, SIDE_TRAPS,
+                      NEIGHBORS, ELEPHANT, LION, TIGER, RAT, COLS, YELLOW, ZOBRIST_SIDE)
+from evaluation import IncrementalPosition, PIECE_VALUES, static_deltas
+from mcts import MCTS
+from parallel import ParallelSearch
+from book import open_book, BOOK_PATH
+from tablebase import open_tablebase, TABLEBASE_DIR, WIN as TABLEBASE_WON, LOSS as TABLEBASE_LOST
+from search import SearchController, SearchLimits, SearchAborted, SearchStats, MoveOrderer, MAX_PLY
+from transposition import TranspositionTable, EvaluationCache, PositionCache, EXACT, LOWER, UPPER, encode_move, decode_move
+import threading
 import time
 
-class AI:
-    def __init__(self):
-        self.transposition_table = {} # Inicializa a tabela de transposição
+WIN_SCORE = 100000  # Valor de uma posição em que um dos lados entrou na toca adversária
+HARD_DEPTH = 5  # Profundidade (em plies, a contar com a jogada da raiz) da dificuldade 'hard'
+MCTS_TIME = 5  # Tempo por jogada (segundos) da dificuldade 'mcts', se não for dado outro limite
+# Vitória segundo a tablebase (menos a distância, para preferir o caminho mais curto)
+TABLEBASE_SCORE = WIN_SCORE - 1000
+# Acima disto a pontuação é de vitória/derrota (toca ou tablebase), não da avaliação
+DECISIVE_SCORE = WIN_SCORE // 2
+
+# Janelas
+WINDOW_EPSILON = 0.01    # largura da janela nula (as avaliações têm passos de 0.1)
+ASPIRATION_WINDOW = 1.0  # meia-largura inicial da janela de aspiração
+ASPIRATION_MAX = 64.0    # a partir daqui a janela passa a ser infinita
+
+# Podas e reduções
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_PIECES = 3  # com menos peças o null move é perigoso (zugzwang)
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3         # as primeiras jogadas nunca são reduzidas
+LMR_DEEP_MOVES = 10       # a partir desta jogada a redução é de 2 plies
+# Margem da futility pruning na fronteira (mobilidade/ataques). Não cobre a metade do valor
+# que uma peça perde ou recupera quando fica (ou deixa de estar) "under_attack" depois de uma
+# jogada calma, por isso a poda é opcional (use_futility)
+FUTILITY_MARGIN = 3.0
+
+# Num ponderhit o tempo já pensado conta para a jogada, mas pesquisa-se pelo menos isto (segundos)
+PONDER_MIN_TIME = 0.2
+
+# Só as pesquisas com pelo menos esta profundidade vão à cache persistente
+CACHE_MIN_DEPTH = 3
+
+# Na cache de avaliações a chave é a de Zobrist sem o lado a jogar, misturada
+# com a dificuldade (avaliação simples ou completa)
+EVAL_CACHE_SALT = (0, 0x9E3779B97F4A7C15)
+
+# Quiescência
+QS_MAX_DEPTH = 8       # plies máximas de quiescência depois do horizonte
+QS_EVASION_DEPTH = 2   # até esta ply de quiescência, uma ameaça à toca obriga a ver todas as respostas
+DELTA_MARGIN = 4       # margem do delta pruning (bónus de mobilidade/posição)
+
 
-    def compute_hash(self,board):
+class AI:
+    def __init__(self, debug_hash=False, debug_eval=False, tt_size_mb=16, use_quiescence=True, use_pvs=True,
+                 use_aspiration=True, use_null_move=True, use_lmr=True, use_futility=False, use_static_order=False,
+                 workers=1, verbose=True, stats_sink=None, eval_cache_mb=4, tablebase=TABLEBASE_DIR,
+                 book=BOOK_PATH, position_cache=None, cache_record=None, corrida_bonus=0):
+        # Tabela de transposição de tamanho fixo (reaproveitada entre jogadas)
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        self.tt_size_mb = tt_size_mb
+        # Cache de avaliações estáticas (0 = sem cache), também mantida entre jogadas
+        self.eval_cache = EvaluationCache(eval_cache_mb) if eval_cache_mb else None
+        # Tablebase de finais (diretório com os ficheiros de tablebase.py; None = sem tablebase)
+        self.tablebase = open_tablebase(tablebase)
+        # Livro de aberturas (ficheiro de book.py; None = sem livro)
+        self.book = open_book(book)
+        # Cache persistente (transposition.PositionCache): position_cache é aberta só
+        # para leitura (pode ser partilhada por vários processos); os resultados desta
+        # execução são gravados em cache_record, para depois se juntarem com o merge
+        # (os processos da pesquisa paralela abrem os mesmos ficheiros; a verificação por XOR
+        # das entradas dispensa locks, como na SharedTranspositionTable)
+        self.cache_record = PositionCache(cache_record, writable=True) if cache_record else None
+        if position_cache and position_cache == cache_record:
+            self.position_cache = None
+        else:
+            self.position_cache = PositionCache(position_cache) if position_cache else None
+        # Número de processos para a pesquisa paralela na raiz (1 = serial)
+        self.workers = workers
+        self.parallel_search = None
+        self.verbose = verbose  # Se False, não escreve o progresso da pesquisa
+        self.debug_hash = debug_hash  # Se True, confirma a chave incremental em cada nó
+        self.debug_eval = debug_eval  # Se True, confirma a avaliação incremental em cada folha
+        self.controller = SearchController()  # Limites da pesquisa em curso (nenhum por omissão)
+        self.move_orderer = MoveOrderer()  # Killers e histórico para ordenar as jogadas
+        # Opções da pesquisa (para se poder medir o efeito de cada técnica)
+        self.use_quiescence = use_quiescence  # Pesquisa de quiescência no horizonte
+        self.use_pvs = use_pvs  # Principal variation search (janelas nulas)
+        self.use_aspiration = use_aspiration  # Janelas de aspiração no iterative deepening
+        self.use_null_move = use_null_move  # Null-move pruning
+        self.use_lmr = use_lmr  # Late-move reductions
+        self.use_futility = use_futility  # Futility pruning na fronteira (ver FUTILITY_MARGIN)
+        self.use_static_order = use_static_order  # Jogadas calmas da fronteira pelo ganho estático
+        # Bónus (limitado) do lado com a peça mais próxima da toca adversária (ver corrida); 0 = desligado
+        self.corrida_bonus = corrida_bonus
+        # Opções com que os processos da pesquisa paralela criam o seu AI (ver parallel._init_worker)
+        self.worker_options = dict(
+            debug_hash=debug_hash, debug_eval=debug_eval, use_quiescence=use_quiescence, use_pvs=use_pvs,
+            use_aspiration=use_aspiration, use_null_move=use_null_move, use_lmr=use_lmr,
+            use_futility=use_futility, use_static_order=use_static_order, eval_cache_mb=eval_cache_mb, tablebase=tablebase,
+            position_cache=position_cache, cache_record=cache_record, corrida_bonus=corrida_bonus)
+        self.last_pv = []
+        self.root_best_move = None  # jogada da raiz que subiu o alpha na iteração em curso
+        self.root_best_score = None  # e o seu valor
+        self.completed_depth = 0
+        self.best_score = None
+        # Estatísticas da última jogada (SearchStats); com stats_sink (um ficheiro
+        # aberto) cada jogada é também escrita como uma linha JSON
+        self.stats = None
+        self.last_stats = None
+        self.stats_sink = stats_sink
+        self.mcts = None  # Árvore do MCTS (criada na primeira jogada e reaproveitada nas seguintes)
+        # Pesquisa no tempo do adversário (ver start_pondering)
+        self.ponder_move = None  # resposta prevista do adversário (None = pesquisa todas)
+        self._ponder_thread = None
+        self._ponder_hash = None
+        self._ponder_result = None
+        # Chamado no fim de cada profundidade completa: on_depth(profundidade, valor, nós, segundos, pv)
+        self.on_depth = None
+
+    def compute_hash(self, pos):
         """
-        Gera uma chave imutável para o estado atual do tabuleiro, baseada nas posições,
-        nomes e estados das peças.
+        Devolve a chave de Zobrist da posição (inclui o lado a jogar).
+        A chave é mantida de forma incremental pela Position; com debug_hash
+        é também recalculada do zero para apanhar erros no make/unmake.
         """
-        key_parts = []
-        # Ordena as chaves para ter consistência (por exemplo, YELLOW e MAGENTA)
-        for side in sorted(board.pieces.keys()):
-            # Ordena as peças por nome para ter uma ordem fixa
-            for piece in sorted(board.pieces[side], key=lambda p: p.name):
-                key_parts.append((piece.name, piece.position, piece.state))
-        return tuple(key_parts)
-
+        if self.debug_hash:
+            assert pos.hash == pos.compute_hash(), "chave de Zobrist incremental inválida"
+        return pos.hash
+
+    def _start_stats(self, method, color):
+        self.stop_pondering()
+        self.stats = SearchStats(method, color)
+        self.stats.workers = self.workers
+        self.controller = SearchController()
+        self.last_pv = []
+        self.completed_depth = 0
+        self.best_score = None
+        self._tt_counts = (self.transposition_table.probes, self.transposition_table.hits)
+        if self.eval_cache is not None:
+            self._eval_counts = (self.eval_cache.probes, self.eval_cache.hits)
+
+    def _finish_stats(self, board_move):
+        """Fecha as estatísticas da jogada (e escreve-as no stats_sink, se houver)."""
+        stats = self.stats
+        controller = self.controller
+        stats.time = time.time() - stats.start_time
+        if board_move:
+            stats.move = move_to_text((square(*board_move[0].position), square(*board_move[1])))
+        stats.score = self.best_score
+        stats.depth = self.completed_depth
+        stats.nodes += controller.nodes
+        stats.qnodes += controller.qnodes
+        stats.tt_cutoffs += controller.tt_cutoffs
+        stats.cutoffs += controller.cutoffs
+        stats.first_move_cutoffs += controller.first_move_cutoffs
+        stats.tb_hits += controller.tb_hits
+        stats.cache_hits += controller.cache_hits
+        stats.tt_probes = self.transposition_table.probes - self._tt_counts[0]
+        stats.tt_hits = self.transposition_table.hits - self._tt_counts[1]
+        if self.eval_cache is not None:
+            stats.eval_probes = self.eval_cache.probes - self._eval_counts[0]
+            stats.eval_hits = self.eval_cache.hits - self._eval_counts[1]
+        stats.pv = [move_to_text(move) for move in self.last_pv]
+        self.last_stats, self.stats = stats, None
+        if self.stats_sink is not None:
+            stats.write(self.stats_sink)
+        return board_move
 
     def get_move_easy(self, board, rules, color):
+        self._start_stats("easy", color)
+        book_move = self._book_move(board, color)
+        if book_move is not None:
+            return self._finish_stats(book_move)
         moves = []
         for piece in board.pieces[color]:
-            moves += [(piece, rules.move(piece))]
+            piece_moves = rules.move(piece)
+            if piece_moves:  # peças mortas ou bloqueadas não têm jogadas
+                moves += [(piece, piece_moves)]
         m = moves[random.randint(0, len(moves) - 1)]
         p = m[0]
         move = m[1][random.randint(0, len(m[1]) - 1)]
-        return (p, move)
+        return self._finish_stats((p, move))
 
     def get_move_medium(self, board, rules, color):
+        self._start_stats("medium", color)
+        book_move = self._book_move(board, color)
+        if book_move is not None:
+            return self._finish_stats(book_move)
+        pos = Position.from_board(board, color)
+        side = pos.side
         best_move = None
         best_score = float('-inf')
-        # Seleciona o melhor movimento utilizando minimax com depth 4.
-        for piece in board.pieces[color]:
-            if piece.state != "Dead":
-                moves = rules.move(piece)
-                for move in moves:
-                    # Simula o movimento num novo estado do tabuleiro
-                    new_board = board.make_move(piece, move)
-                    # Avalia o estado usando minimax (aqui, depth=2 e turno do adversário)
-                    score = self.minimax(new_board, rules, depth=2, maximizingPlayer=False, color=color)
-                    if score > best_score:
-                        best_score = score
-                        best_move = (piece, move)
+        # Seleciona o melhor movimento utilizando minimax com depth 2.
+        for move in pos.legal_moves():
+            # Simula o movimento na própria posição (é desfeito logo a seguir)
+            token = pos.make_move(move)
+            # Avalia o estado usando minimax (aqui, depth=2 e turno do adversário)
+            score = self.minimax(pos, depth=2, maximizingPlayer=False, color=side)
+            pos.unmake_move(token)
+            if score > best_score:
+                best_score = score
+                best_move = move
+        self.best_score = best_score if best_move else None
+        self.completed_depth = 3
+        return self._finish_stats(to_board_move(board, best_move) if best_move else None)
+
+    def get_move_hard(self, board, rules, color, depth=HARD_DEPTH):
+        """
+        Pesquisa de profundidade fixa (iterative deepening sem limite de tempo).
+        Com workers > 1 as jogadas da raiz são pesquisadas em paralelo, depois de
+        uma pesquisa serial menos profunda que as ordena.
+        """
+        root = Position.from_board(board, color)
+        if self._is_ponder_hit(root):
+            best_move = self._continue_pondering("hard", SearchLimits(depth=depth))
+            return self._finish_stats(to_board_move(board, best_move) if best_move else None)
+        self._start_stats("hard", color)
+        book_move = self._book_move(board, color)
+        if book_move is not None:
+            return self._finish_stats(book_move)
+        if self.workers > 1 and depth > 1:
+            best_move = self.parallel_root_search(root, depth)
+        else:
+            self.controller = SearchController(SearchLimits(depth=depth))
+            best_move = self.iterative_deepening(root, verbose=False)
+        return self._finish_stats(to_board_move(board, best_move) if best_move else None)
+
+    def parallel_root_search(self, root, depth):
+        """Pesquisa a raiz à profundidade `depth` com o pool de processos. Devolve a jogada."""
+        moves = self.get_ordered_moves(root)
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+        # Uma pesquisa serial mais curta põe a jogada mais provável em primeiro lugar
+        self.controller = SearchController(SearchLimits(depth=max(1, depth - 2)))
+        first = self.iterative_deepening(root, verbose=False)
+        moves.remove(first)
+        moves.insert(0, first)
+        best_move, score = self._parallel().root_split(root, moves, depth)
+        self._record_parallel(best_move, score)
         return best_move
 
-    def get_move_hard(self, board, rules, color):
-        best_move = None
-        best_score = float('-inf')
+    def start_pondering(self, board, color):
+        """
+        Começa a pesquisar no tempo do adversário, numa thread. `board` é o
+        tabuleiro depois da jogada do AI (`color`), com o adversário a jogar. Se
+        a variante principal tiver a resposta prevista, pesquisa-se a posição
+        depois dela; se não, pesquisa-se a posição do adversário (o que enche a
+        tabela de transposição para todas as respostas). Enquanto o input() do
+        jogador espera, a thread corre sem disputar o GIL.
+
+        Na jogada seguinte (get_move_hard ou get_move_hard_iterative), se o
+        adversário fez a jogada prevista (ponderhit) a pesquisa continua com os
+        limites dessa jogada; se não, é parada e a tabela fica aproveitada.
+        """
+        opponent = SIDES[1 - SIDES.index(color)]
+        pos = Position.from_board(board, opponent)
+        if pos.winner() is not None or not pos.legal_moves():
+            return
+        self.ponder_move = None
+        # A resposta da variante principal só serve se a variante começar pela jogada feita
+        pv = self.last_pv
+        played = self.last_stats.move if self.last_stats is not None else None
+        reply = pv[1] if len(pv) > 1 and move_to_text(pv[0]) == played else None
+        if reply is None:
+            entry = self.transposition_table.probe(pos.hash)
+            reply = decode_move(entry[3]) if entry is not None else None
+        if reply in pos.legal_moves():
+            pos.make_move(reply)
+            self.ponder_move = reply
+            if pos.winner() is not None:
+                return
+        if self.book is not None and self.book.entries(pos.hash):
+            return  # a resposta já está no livro
+        self._start_stats("ponder", SIDES[pos.side])
+        self.controller = SearchController(SearchLimits(depth=MAX_PLY // 2))
+        self._ponder_hash = pos.hash
+        self._ponder_result = None
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(pos,), daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder(self, pos):
+        self._ponder_result = self.iterative_deepening(pos, verbose=False)
+
+    def stop_pondering(self):
+        """Para a pesquisa no tempo do adversário (se estiver a correr) e espera pela thread."""
+        if self._ponder_thread is not None:
+            self.controller.stop()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+            self._ponder_hash = None
+
+    def _is_ponder_hit(self, root):
+        """A pesquisa em segundo plano está na posição `root` (o adversário jogou a resposta prevista)."""
+        return self._ponder_thread is not None and self._ponder_hash == root.hash
+
+    def _continue_pondering(self, method, limits):
+        """Ponderhit: a pesquisa em curso passa a ter os limites desta jogada. Devolve a jogada."""
+        self.stats.method = method
+        self.stats.ponder_hit = True
+        controller = self.controller
+        controller.limits = limits
+        if limits.depth is not None and self.completed_depth >= limits.depth:
+            controller.stop()  # já chegou à profundidade pedida
+        if self.verbose:
+            print(f"Ponderhit: {controller.elapsed():.1f}s já pensados, profundidade {self.completed_depth}")
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        self._ponder_hash = None
+        return self._ponder_result
+
+    def _book_move(self, board, color):
+        """Jogada do livro de aberturas para o tabuleiro (já no formato do Board), ou None."""
+        if self.book is None:
+            return None
+        pos = Position.from_board(board, color)
+        move = self.book.choose(pos)
+        if move is None:
+            return None
+        self.stats.book = True
+        self.last_pv = [move]
+        return to_board_move(board, move)
+
+    def _record_parallel(self, best_move, score):
+        """Resultado de uma pesquisa paralela em completed_depth/best_score/last_pv e nas estatísticas."""
+        search = self.parallel_search
+        self.completed_depth, self.best_score = search.completed_depth, score
+        self.last_pv = [best_move] if best_move else []
+        if self.stats is not None:
+            self.stats.nodes += search.nodes
+            self.stats.add_depth(search.completed_depth, score, self.controller.nodes + search.nodes,
+                                 time.time() - self.stats.start_time, [move_to_text(m) for m in self.last_pv])
+
+    def _parallel(self):
+        if self.parallel_search is None:
+            self.parallel_search = ParallelSearch(self.workers, self.tt_size_mb, self.worker_options)
+        return self.parallel_search
+
+    def close(self):
+        """Termina os processos da pesquisa paralela (se existirem) e fecha as caches persistentes."""
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+        for cache in (self.position_cache, self.cache_record):
+            if cache is not None:
+                cache.close()
+
+    def get_move_hard_iterative(self, board, rules, color, time_limit=10, soft_time=None, max_nodes=None,
+                                max_depth=None):
+        """
+        Realiza iterative deepening para buscar o melhor movimento para a dificuldade 'hard'.
+        Tenta profundidades sucessivas até se esgotar o tempo (em segundos) ou o
+        número de nós. `time_limit` é o limite duro: a iteração em curso é abortada
+        e fica o resultado da última profundidade completa. Com `soft_time` não se
+        começa uma nova profundidade depois desse tempo (por omissão usa-se o
+        tempo todo). Com workers > 1 usa Lazy SMP (ver parallel.py).
+        """
+        root = Position.from_board(board, color)
+        if soft_time is None:
+            soft_time = time_limit
+        if self._is_ponder_hit(root):
+            # O tempo já pensado conta para esta jogada
+            elapsed = self.controller.elapsed()
+            limits = SearchLimits(depth=max_depth, soft_time=max(soft_time, elapsed + PONDER_MIN_TIME),
+                                  hard_time=max(time_limit, elapsed + PONDER_MIN_TIME), nodes=max_nodes)
+            best_move = self._continue_pondering("iterative", limits)
+            return self._finish_stats(to_board_move(board, best_move) if best_move else None)
+        self._start_stats("iterative", color)
+        book_move = self._book_move(board, color)
+        if book_move is not None:
+            return self._finish_stats(book_move)
+        limits = SearchLimits(depth=max_depth, soft_time=soft_time, hard_time=time_limit, nodes=max_nodes)
+        if self.workers > 1:
+            # Lazy SMP: todos os processos pesquisam a mesma raiz com a tabela partilhada
+            best_move, score = self._parallel().lazy_smp(root, limits)
+            self._record_parallel(best_move, score)
+            if self.verbose:
+                print(f"Profundidade {self.parallel_search.completed_depth} completa: melhor score = {score}")
+        else:
+            self.controller = SearchController(limits)
+            best_move = self.iterative_deepening(root, verbose=self.verbose)
+        return self._finish_stats(to_board_move(board, best_move) if best_move else None)
 
-        for piece in board.pieces[color]:
-            if piece.state != "Dead":
-                moves = rules.move(piece)
-                for move in moves:
-                    new_board = board.make_move(piece, move)
-                    score = self.minimax_ab(new_board, rules, depth=4, maximizingPlayer=False, alpha=float('-inf'), beta=float('inf'), color=color)
-                    if score > best_score:
-                        best_score = score
-                        best_move = (piece, move)
+    def search_position(self, pos, controller):
+        """
+        Pesquisa uma Position (sem Board) com o SearchController dado, que quem
+        chama pode parar a partir de outra thread (ver protocol.py). Com
+        workers > 1 usa Lazy SMP. Devolve a melhor jogada (origem, destino), ou
+        None; o resto fica em last_stats, last_pv e best_score.
+        """
+        self._start_stats("iterative", SIDES[pos.side])
+        self.controller = controller
+        if self.workers > 1:
+            search = self._parallel()
+            shared_table = search.transposition_table
+
+            def depth_done(depth, score, move, nodes, elapsed):
+                # Profundidade completa num dos processos; a PV vem da tabela partilhada
+                self.completed_depth, self.best_score = depth, score
+                self.last_pv = self.get_pv(pos, move, depth, shared_table)
+                if self.on_depth is not None:
+                    self.on_depth(depth, score, nodes, elapsed, self.last_pv)
+
+            best_move, score = search.lazy_smp(pos, controller.limits, controller, depth_done)
+            self._record_parallel(best_move, score)
+            self.last_pv = self.get_pv(pos, best_move, self.completed_depth, shared_table)
+        else:
+            best_move = self.iterative_deepening(pos, verbose=False)
+        self._finish_stats(None)
+        self.last_stats.move = move_to_text(best_move) if best_move else None
         return best_move
 
-    def get_move_hard_iterative(self, board, rules, color, time_limit=10):
+    def get_move_mcts(self, board, rules, color, iterations=None, time_limit=None, parallel="root", batch=8):
         """
-        Realiza iterative deepening para buscar o melhor movimento para a dificuldade 'hard'.
-        O mé3t0do tenta profundidades sucessivas até o tempo limite (em segundos) ser alcançado.
-        Retorna o melhor movimento encontrado até o momento.
+        Monte Carlo Tree Search (ver mcts.py). O orçamento é um número de
+        iterações (playouts), um tempo em segundos ou os dois (para no primeiro
+        que se esgotar); sem nenhum usa MCTS_TIME segundos. A árvore é
+        reaproveitada na jogada seguinte. Com workers > 1 a pesquisa é
+        paralelizada na raiz (parallel="root") ou nas folhas (parallel="leaf",
+        `batch` rollouts por chamada a cada processo); ver parallel.py.
         """
-        start_time = time.time()
-        best_move = None
-        depth = 1
-
-        while True:
-            if time.time() - start_time >= time_limit:
+        self._start_stats("mcts", color)
+        book_move = self._book_move(board, color)
+        if book_move is not None:
+            return self._finish_stats(book_move)
+        if self.mcts is None:
+            self.mcts = MCTS()
+        if iterations is None and time_limit is None:
+            time_limit = MCTS_TIME
+        root = Position.from_board(board, color)
+        if self.workers > 1 and parallel == "root":
+            best_move, self.best_score = self._parallel().mcts_root(root, iterations, time_limit)
+            self.last_pv = [best_move] if best_move else []
+            self.stats.nodes = self.parallel_search.nodes
+            self.completed_depth = self.parallel_search.completed_depth
+        else:
+            if self.workers > 1:
+                best_move = self._parallel().mcts_leaf(self.mcts, root, iterations, time_limit, batch)
+            else:
+                best_move = self.mcts.search(root, iterations, time_limit)
+            self.stats.nodes = self.mcts.iterations
+            self.completed_depth = self.mcts.max_depth
+            self.best_score = self.mcts.root_win_rate()
+            self.last_pv = self.mcts.principal_variation()
+        if self.verbose:
+            elapsed = time.time() - self.stats.start_time
+            per_core = self.stats.nodes / elapsed / self.workers if elapsed else 0.0
+            print(f"MCTS: {self.stats.nodes} playouts ({per_core:.0f}/s por processo), vitórias {self.best_score}")
+        return self._finish_stats(to_board_move(board, best_move) if best_move else None)
+
+    def iterative_deepening(self, root, verbose=True, start_depth=1):
+        """
+        Ciclo de iterative deepening sobre a raiz, dentro dos limites de self.controller.
+        A melhor jogada da iteração anterior é pesquisada primeiro e o seu valor
+        define a janela de aspiração da iteração seguinte. Devolve a melhor jogada
+        (origem, destino), ou None se não houver jogadas. A profundidade da última
+        iteração completa fica em completed_depth; o valor e a variante da jogada
+        devolvida ficam em best_score e last_pv (se uma iteração interrompida mudou
+        a jogada, são os dessa iteração).
+        """
+        # A pesquisa usa a avaliação incremental (ver evaluation.py)
+        root = IncrementalPosition.from_position(root)
+        self.move_orderer.new_search()
+        self.transposition_table.new_search()
+        self.last_pv = []
+        self.completed_depth = 0
+        self.best_score = None
+
+        root_moves = self.get_ordered_moves(root)
+        if not root_moves:
+            return None
+        # Raiz já pesquisada noutra execução com a profundidade pedida: não se repete
+        cached = self._probe_cache(root.hash)
+        limit = self.controller.limits.depth
+        if cached is not None and cached[2] == EXACT and limit is not None and cached[0] >= limit:
+            move = decode_move(cached[3])
+            if move in root_moves:
+                self.completed_depth, self.best_score = cached[0], cached[1]
+                self.last_pv = [move]
+                return move
+        best_move = root_moves[0]
+        best_score = None
+        depth = start_depth
+
+        while len(root_moves) > 1 and self.controller.can_start_depth(depth):
+            # A melhor jogada da profundidade anterior é pesquisada primeiro
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+            pos = root.copy()
+            self.root_best_move = None
+            try:
+                if self.use_aspiration and best_score is not None and depth >= 3 \
+                        and abs(best_score) < DECISIVE_SCORE:
+                    score, move = self.aspiration_search(pos, root_moves, depth, best_score)
+                else:
+                    score, move = self.search_root(pos, root_moves, depth, float('-inf'), float('inf'))
+            except SearchAborted:
+                # Iteração incompleta: só é aproveitada se uma jogada já completa
+                # bateu a melhor jogada anterior (que foi pesquisada primeiro)
+                if self.root_best_move is not None and self.root_best_move != best_move:
+                    best_move = self.root_best_move
+                    self.best_score = self.root_best_score
+                    self.last_pv = self.get_pv(root, best_move, depth)
                 break
 
-            current_best_move = None
-            best_score = float('-inf')
-
-            # Percorre todas as peças da cor (da IA)
-            for piece in board.pieces[color]:
-                if piece.state != "Dead":
-                    # Obter os movimentos ordenados para a peça (para maximizador)
-                    moves = self.get_ordered_moves(board, rules, piece, color, maximizingPlayer=True)
-                    for move in moves:
-                        new_board = board.make_move(piece, move)
-                        # Avalia usando minimax_ab com a profundidade atual
-                        try:
-                            score = self.minimax_ab(new_board, rules, depth, maximizingPlayer=False,
-                                                    alpha=float('-inf'), beta=float('inf'), color=color,
-                                                    start_time=start_time, time_limit=time_limit)
-                        except Exception as e:
-                            score = self.evaluate_position(new_board, rules, 1)
-                        if score > best_score:
-                            best_score = score
-                            current_best_move = (piece, move)
-
-            print(f"Profundidade {depth} completa: melhor score = {best_score}")
-
-            # Atualiza o melhor movimento se essa iteração foi concluída sem exceder o tempo
-            best_move = current_best_move
+            if verbose:
+                print(f"Profundidade {depth} completa: melhor score = {score}")
+
+            # A iteração foi concluída sem exceder o tempo: fica com o seu resultado
+            best_move, best_score = move, score
+            self.completed_depth, self.best_score = depth, score
+            self.last_pv = self.get_pv(root, best_move, depth)
+            if self.stats is not None:
+                self.stats.add_depth(depth, score, self.controller.nodes, self.controller.elapsed(),
+                                     [move_to_text(m) for m in self.last_pv])
+            if self.on_depth is not None:
+                self.on_depth(depth, score, self.controller.nodes, self.controller.elapsed(), self.last_pv)
+            if best_score >= WIN_SCORE:
+                break  # vitória garantida, não vale a pena pesquisar mais fundo
 
             depth += 1  # Aumenta a profundidade para a próxima iteração
 
         return best_move
 
+    def aspiration_search(self, pos, root_moves, depth, previous_score):
+        """
+        Pesquisa a raiz com uma janela estreita à volta do valor da iteração anterior;
+        se o valor cair fora da janela, alarga-a desse lado e repete.
+        """
+        window = ASPIRATION_WINDOW
+        alpha, beta = previous_score - window, previous_score + window
+        while True:
+            score, move = self.search_root(pos, root_moves, depth, alpha, beta)
+            if score <= alpha:
+                window *= 4
+                alpha = previous_score - window if window < ASPIRATION_MAX else float('-inf')
+            elif score >= beta:
+                window *= 4
+                beta = previous_score + window if window < ASPIRATION_MAX else float('inf')
+            else:
+                return score, move
+
+    def search_root(self, pos, moves, depth, alpha, beta):
+        """Negamax na raiz (PVS entre as jogadas da raiz). Devolve (valor, jogada)."""
+        alpha_orig = alpha
+        best_score = float('-inf')
+        best_move = moves[0]
+        for i, move in enumerate(moves):
+            token = pos.make_move(move)
+            if i == 0 or not self.use_pvs:
+                score = -self.negamax(pos, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self.negamax(pos, depth - 1, -alpha - WINDOW_EPSILON, -alpha, 1)
+                if alpha < score < beta:
+                    score = -self.negamax(pos, depth - 1, -beta, -alpha, 1)
+            pos.unmake_move(token)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                self.root_best_move = move
+                self.root_best_score = score
+                if alpha >= beta:
+                    break
+        flag = self._bound(best_score, alpha_orig, beta)
+        self.transposition_table.store(pos.hash, depth, best_score, flag, encode_move(best_move))
+        if self.cache_record is not None and depth >= CACHE_MIN_DEPTH:
+            self.cache_record.store(pos.hash, depth, best_score, flag, encode_move(best_move))
+        return best_score, best_move
+
+    def get_pv(self, root, first_move, max_length, table=None):
+        """
+        Variante principal: a jogada da raiz seguida das melhores jogadas da tabela
+        (por omissão a do AI; na pesquisa paralela, a partilhada).
+        """
+        if table is None:
+            table = self.transposition_table
+        pos = root.copy()
+        pv = []
+        seen = {pos.hash}
+        move = first_move
+        while move is not None and len(pv) < max_length and move in pos.legal_moves():
+            pv.append(move)
+            pos.make_move(move)
+            if pos.hash in seen or pos.winner() is not None:
+                break
+            seen.add(pos.hash)
+            entry = table.probe(pos.hash)
+            move = decode_move(entry[3]) if entry is not None else None
+        return pv
+
 
-    def minimax(self, board, rules, depth, maximizingPlayer, color=None):
-        if color is None:
-            color = "MAGENTA" # default
+    def minimax(self, pos, depth, maximizingPlayer, color=1):
+        self.controller.count_node()
         # Se o depth for 0 ou se o jogo tiver terminado, avalia a posição.
-        victory = rules.check_victory()
-        if depth == 0 or victory:
-            return self.evaluate_position(board, rules, 0)
+        if depth == 0 or pos.winner() is not None:
+            return self.evaluate_position(pos, 0, color)
+
+        moves = pos.legal_moves()
+        if not moves:
+            # Sem jogadas possíveis: o lado a jogar perde por imobilização
+            return -WIN_SCORE if maximizingPlayer else WIN_SCORE
 
         if maximizingPlayer:
             max_eval = float('-inf')
-            for piece in board.pieces[board.ai_color]:
-                if piece.state != "Dead":
-                    moves = rules.move(piece)
-                    for move in moves:
-                        new_board = board.make_move(piece, move)
-                        eval = self.minimax(new_board, rules, depth - 1, False)
-                        max_eval = max(max_eval, eval)
+            for move in moves:
+                token = pos.make_move(move)
+                eval = self.minimax(pos, depth - 1, False, color)
+                pos.unmake_move(token)
+                max_eval = max(max_eval, eval)
             return max_eval
         else:
             min_eval = float('inf')
-            for piece in board.pieces[board.opponent_color]:
-                if piece.state != "Dead":
-                    moves = rules.move(piece)
-                    for move in moves:
-                        new_board = board.make_move(piece, move)
-                        eval = self.minimax(new_board, rules, depth - 1, True)
-                        min_eval = min(min_eval, eval)
+            for move in moves:
+                token = pos.make_move(move)
+                eval = self.minimax(pos, depth - 1, True, color)
+                pos.unmake_move(token)
+                min_eval = min(min_eval, eval)
             return min_eval
 
-    def minimax_ab(self, board, rules, depth, maximizingPlayer, alpha, beta, color=None, start_time=None, time_limit=10):
-        if start_time is None:
-            start_time = time.time()
-        # Verifica se o tempo excedeu o limite
-        if time.time() - start_time > time_limit:
-            # Se o tempo excedeu, retorna uma avaliação rápida do estado atual
-            return self.evaluate_position(board, rules, 1)
+    def minimax_ab(self, pos, depth, maximizingPlayer, alpha, beta, color=1, ply=1):
+        """
+        Valor da posição do ponto de vista de `color`, calculado com o negamax
+        (mantido para quem ainda usa a interface max/min; `maximizingPlayer`
+        corresponde a pos.side == color).
+        """
+        if pos.side == color:
+            return self.negamax(pos, depth, alpha, beta, ply)
+        return -self.negamax(pos, depth, -beta, -alpha, ply)
+
+    def negamax(self, pos, depth, alpha, beta, ply, allow_null=True):
+        """
+        Alpha-beta em forma negamax: o valor é sempre do ponto de vista do lado a
+        jogar. Inclui PVS (janela nula nas jogadas depois da primeira), null-move
+        pruning, late-move reductions e futility pruning na fronteira, cada um com
+        a sua opção no AI.
+        """
+        # Conta o nó; se o tempo/nós acabarem, lança SearchAborted (a iteração é descartada)
+        self.controller.count_node()
+        if pos.winner() is not None:
+            return -WIN_SCORE  # o adversário acabou de entrar na nossa toca
+        if self.tablebase is not None:
+            value = self._probe_tablebase(pos)
+            if value is not None:
+                return value  # valor exato: a subárvore não é pesquisada
 
-        if color is None:
-            color = "MAGENTA"
         # Calcula a chave para o estado atual do tabuleiro
-        key = self.compute_hash(board)
+        key = self.compute_hash(pos)
+        alpha_orig = alpha
+        tt_move = None
         # Se já avaliamos esse estado com profundidade igual ou maior, reutilizar o valor
-        if key in self.transposition_table:
-            stored_depth, stored_value = self.transposition_table[key]
+        # (um valor de uma poda só vale como limite inferior/superior)
+        entry = self.transposition_table.probe(key)
+        if entry is None and depth >= CACHE_MIN_DEPTH:
+            entry = self._probe_cache(key)
+        if entry is not None:
+            stored_depth, stored_value, flag, stored_move = entry
+            tt_move = decode_move(stored_move)
             if stored_depth >= depth:
-                return stored_value
-
-        victory = rules.check_victory()
-        if depth == 0 or victory:
-            value = self.evaluate_position(board, rules, 1)
-            self.transposition_table[key] = depth, value
+                if flag == EXACT:
+                    self.controller.tt_cutoffs += 1
+                    return stored_value
+                if flag == LOWER:
+                    alpha = max(alpha, stored_value)
+                else:
+                    beta = min(beta, stored_value)
+                if alpha >= beta:
+                    self.controller.tt_cutoffs += 1
+                    return stored_value
+
+        if depth <= 0:
+            if not self.use_quiescence:
+                value = self.evaluate_position(pos, 1, pos.side)
+                self.transposition_table.store(key, 0, value, EXACT)
+                return value
+            # No horizonte continua só com capturas/entradas na toca até a posição ficar calma
+            value = self.quiescence(pos, alpha, beta, ply)
+            self.transposition_table.store(key, 0, value, self._bound(value, alpha_orig, beta))
             return value
-        if maximizingPlayer:
-            max_eval = float('-inf')
-            for piece in board.pieces[board.ai_color]:
-                if piece.state != "Dead":
-                    moves = self.get_ordered_moves(board, rules, piece, color, maximizingPlayer=True)
-                    for move in moves:
-                        new_board = board.make_move(piece, move)
-                        eval_value = self.minimax_ab(new_board, rules, depth - 1, False, alpha, beta, color, start_time, time_limit)
-                        max_eval = max(max_eval, eval_value)
-                        alpha = max(alpha, eval_value)
-                        if beta <= alpha:
-                            break  # poda beta
-            self.transposition_table[key] = (depth, max_eval)
-            return max_eval
+
+        pv_node = beta - alpha > WINDOW_EPSILON
+
+        # Null move: se mesmo passando a vez o valor fica >= beta, a posição é boa
+        # demais e pode ser podada. Não se usa com pouco material (zugzwang).
+        if (self.use_null_move and allow_null and not pv_node and depth >= NULL_MOVE_MIN_DEPTH
+                and self._piece_count(pos, pos.side) >= NULL_MOVE_MIN_PIECES
+                and self.evaluate_position(pos, 1, pos.side) >= beta):
+            token = pos.make_null_move()
+            score = -self.negamax(pos, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + WINDOW_EPSILON,
+                                  ply + 1, allow_null=False)
+            pos.unmake_null_move(token)
+            if score >= beta:
+                return score
+
+        # A melhor jogada guardada na tabela é tentada primeiro
+        # Num nó da fronteira o ganho estático de cada filho é calculado uma vez, para
+        # todas as jogadas, e serve para as ordenar e para a futility pruning
+        gains = None
+        if depth == 1 and (self.use_static_order or self.use_futility):
+            gains = static_deltas(pos, pos.legal_moves())
+        moves = self.get_ordered_moves(pos, ply, tt_move, gains if self.use_static_order else None)
+        if not moves:
+            return -WIN_SCORE  # sem jogadas: perde por imobilização
+
+        target_den = DEN_SQUARE[1 - pos.side]
+        killers = self.move_orderer.killers[ply] if ply < MAX_PLY else ()
+
+        # Futility pruning na fronteira: se a avaliação mais o ganho estático da
+        # jogada mais uma margem não chega a alpha, a jogada calma não é pesquisada
+        futility_base = None
+        if (self.use_futility and depth == 1 and not pv_node and abs(alpha) < DECISIVE_SCORE
+                and not self._den_threatened(pos)):
+            futility_base = self.evaluate_position(pos, 1, pos.side) + FUTILITY_MARGIN
+            if futility_base > alpha:
+                futility_base = None
+
+        best_score = float('-inf')
+        best_move = None
+        for i, move in enumerate(moves):
+            if i > 0 and ply == 1 and -self.controller.root_alpha < beta:
+                # Divisão da raiz: outro processo subiu o alpha da raiz, a janela estreita-se
+                beta = -self.controller.root_alpha
+                if best_score >= beta:
+                    break
+            quiet = pos.board[move[1]] < 0 and move[1] != target_den
+            if futility_base is not None and i > 0 and quiet and futility_base + gains[move] <= alpha:
+                if futility_base > best_score:
+                    best_score = futility_base
+                continue
+            token = pos.make_move(move)
+            if i == 0:
+                score = -self.negamax(pos, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late-move reductions: jogadas calmas tardias são pesquisadas com menos profundidade
+                reduction = 0
+                if (self.use_lmr and quiet and depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES
+                        and move not in killers):
+                    reduction = 2 if i >= LMR_DEEP_MOVES and depth >= 6 else 1
+                if self.use_pvs:
+                    window_alpha = -alpha - WINDOW_EPSILON
+                else:
+                    window_alpha = -beta
+                score = -self.negamax(pos, depth - 1 - reduction, window_alpha, -alpha, ply + 1)
+                if reduction and score > alpha:
+                    score = -self.negamax(pos, depth - 1, window_alpha, -alpha, ply + 1)
+                if self.use_pvs and alpha < score < beta:
+                    score = -self.negamax(pos, depth - 1, -beta, -alpha, ply + 1)
+            pos.unmake_move(token)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    self.move_orderer.record_cutoff(pos, move, ply, depth)
+                    self.controller.cutoffs += 1
+                    if i == 0:
+                        self.controller.first_move_cutoffs += 1
+                    break  # poda
+
+        flag = self._bound(best_score, alpha_orig, beta)
+        self.transposition_table.store(key, depth, best_score, flag, encode_move(best_move))
+        if self.cache_record is not None and depth >= CACHE_MIN_DEPTH:
+            self.cache_record.store(key, depth, best_score, flag, encode_move(best_move))
+        return best_score
+
+    def _probe_cache(self, key):
+        """Entrada das caches persistentes (a desta execução primeiro), no formato da tabela de transposição."""
+        for cache in (self.cache_record, self.position_cache):
+            if cache is not None:
+                entry = cache.probe(key)
+                if entry is not None:
+                    self.controller.cache_hits += 1
+                    return entry
+        return None
+
+    def _probe_tablebase(self, pos):
+        """Valor exato da posição (do lado a jogar) segundo a tablebase, ou None se não estiver lá."""
+        entry = self.tablebase.probe(pos)
+        if entry is None:
+            return None
+        self.controller.tb_hits += 1
+        wdl, distance = entry
+        if wdl == TABLEBASE_WON:
+            return TABLEBASE_SCORE - distance
+        if wdl == TABLEBASE_LOST:
+            return -TABLEBASE_SCORE + distance
+        return 0
+
+    def _den_threatened(self, pos):
+        """Há uma peça adversária ao lado da toca do lado a jogar."""
+        side = pos.side
+        return any(pos.board[sq] >= 0 and pos.board[sq] >> 3 != side for _, sq in NEIGHBORS[DEN_SQUARE[side]])
+
+    def _piece_count(self, pos, side):
+        return sum(1 for sq in pos.squares[side * 8:side * 8 + 8] if sq >= 0)
+
+    def _bound(self, value, alpha, beta):
+        """Tipo de valor (exato ou limite) em relação à janela original da pesquisa."""
+        if value <= alpha:
+            return UPPER
+        if value >= beta:
+            return LOWER
+        return EXACT
+
+    def quiescence(self, pos, alpha, beta, ply, qdepth=0):
+        """
+        Pesquisa de quiescência (negamax): a partir do horizonte só se pesquisam
+        capturas e entradas na toca adversária, até a posição ficar calma. O lado a
+        jogar pode sempre ficar com a avaliação estática (stand pat), exceto se o
+        adversário ameaçar entrar na toca; nesse caso todas as respostas são
+        pesquisadas. Capturas que nem com a peça capturada chegam a alpha são
+        ignoradas (delta pruning).
+        """
+        self.controller.count_qnode()
+        if pos.winner() is not None:
+            return -WIN_SCORE
+        if self.tablebase is not None:
+            value = self._probe_tablebase(pos)
+            if value is not None:
+                return value
+        stand_pat = self.evaluate_position(pos, 1, pos.side)
+        if qdepth >= QS_MAX_DEPTH or ply >= MAX_PLY:
+            return stand_pat
+
+        side = pos.side
+        target_den = DEN_SQUARE[1 - side]
+        evasion = any(pos.board[sq] >= 0 and pos.board[sq] >> 3 != side
+                      for _, sq in NEIGHBORS[DEN_SQUARE[side]])
+        if evasion and qdepth < QS_EVASION_DEPTH:
+            moves = self.get_ordered_moves(pos, ply)
+            if not moves:
+                return -WIN_SCORE
+            best = float('-inf')
         else:
-            min_eval = float('inf')
-            for piece in board.pieces[board.opponent_color]:
-                if piece.state != "Dead":
-                    moves = self.get_ordered_moves(board, rules, piece, color, maximizingPlayer=False)
-                    for move in moves:
-                        new_board = board.make_move(piece, move)
-                        eval_value = self.minimax_ab(new_board, rules, depth - 1, True, alpha, beta, color, start_time, time_limit)
-                        min_eval = min(min_eval, eval_value)
-                        beta = min(beta, eval_value)
-                        if beta <= alpha:
-                            break  # poda alfa
-            self.transposition_table[key] = (depth, min_eval)
-            return min_eval
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            best = stand_pat
+            board = pos.board
+            moves = [m for m in pos.legal_moves() if board[m[1]] >= 0 or m[1] == target_den]
+            self.move_orderer.order(pos, moves, ply)
+            evasion = False
 
-    def get_ordered_moves(self, board, rules, piece, color, maximizingPlayer):
-        # Obtém os movimentos legais para a peça
-        moves = rules.move(piece)
-        move_evaluations = []
         for move in moves:
-            # Simula o movimento
-            new_board = board.make_move(piece, move)
-            # Usa uma avaliação rápida (simple_evaluate_side)
-            eval_value = self.simple_evaluate_side(new_board, rules, color)
-            move_evaluations.append((move, eval_value))
-        # Se for maximizador, queremos os maiores valores primeiro; se for minimizador, os menores
-        if maximizingPlayer:
-            move_evaluations.sort(key=lambda x: x[1], reverse=True)
-        else:
-            move_evaluations.sort(key=lambda x: x[1])
-        # Retorna apenas a lista ordenada de movimentos
-        return [move for move, score in move_evaluations]
+            victim = pos.board[move[1]]
+            if not evasion and victim >= 0 and move[1] != target_den:
+                if stand_pat + PIECE_VALUES[victim & 7] + DELTA_MARGIN <= alpha:
+                    continue
+            token = pos.make_move(move)
+            score = -self.quiescence(pos, -beta, -alpha, ply + 1, qdepth + 1)
+            pos.unmake_move(token)
+            if score > best:
+                best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return best
+
+    def get_ordered_moves(self, pos, ply=0, tt_move=None, gains=None):
+        """
+        Jogadas legais do lado a jogar, ordenadas sem as simular: jogada da tabela de
+        transposição, capturas (MVV-LVA), killers da ply e histórico. Com `gains`
+        ({jogada: ganho estático}, de static_deltas) as jogadas calmas são ordenadas
+        por esse ganho em vez do histórico (nós da fronteira).
+        """
+        return self.move_orderer.order(pos, pos.legal_moves(), ply, tt_move, gains)
 
 
-    def evaluate_position(self, board, rules, difficulty):
+    def evaluate_position(self, pos, difficulty, color):
         """
         Avalia a posição geral subtraindo a pontuação do adversário
-        da pontuação da IA.
+        da pontuação da IA (`color` é o lado da IA: 0 = YELLOW, 1 = MAGENTA).
         """
+        winner = pos.winner()
+        if winner is not None:
+            return WIN_SCORE if winner == color else -WIN_SCORE
+        # O valor é calculado do ponto de vista do YELLOW (para o MAGENTA é o simétrico),
+        # para que a mesma entrada da cache sirva os dois lados
+        cache = self.eval_cache
+        if cache is None:
+            value = self._static_value(pos, difficulty)
+        else:
+            key = pos.hash ^ (ZOBRIST_SIDE if pos.side else 0) ^ EVAL_CACHE_SALT[difficulty]
+            value = cache.probe(key)
+            if value is None:
+                value = self._static_value(pos, difficulty)
+                cache.store(key, value)
+        return value if color == YELLOW else -value
+
+    def _static_value(self, pos, difficulty):
+        """Pontuação do YELLOW menos a do MAGENTA (sem contar com o vencedor)."""
         if difficulty == 0:
-            ai_score = self.simple_evaluate_side(board, rules, board.ai_color)
-            opponent_score = self.simple_evaluate_side(board, rules, board.opponent_color)
+            return self.simple_evaluate_side(pos, 0) - self.simple_evaluate_side(pos, 1)
+        if isinstance(pos, IncrementalPosition):
+            value = pos.evaluate_side(0) - pos.evaluate_side(1)
+            if self.debug_eval:
+                # Referência numa Position normal (jogadas geradas de novo, não as guardadas)
+                plain = Position(pos.squares, pos.side)
+                reference = self.complex_evaluate_side(plain, 0) - self.complex_evaluate_side(plain, 1)
+                assert abs(value - reference) < 1e-6, f"avaliação incremental inválida: {value} != {reference}"
         else:
-            ai_score = self.complex_evaluate_side(board, rules, board.ai_color)
-            opponent_score = self.complex_evaluate_side(board, rules, board.opponent_color)
-        return ai_score - opponent_score
+            value = self.complex_evaluate_side(pos, 0) - self.complex_evaluate_side(pos, 1)
+        if self.corrida_bonus:
+            value += self.corrida_bonus * (self.corrida(pos, 0)[0] - self.corrida(pos, 1)[0])
+        return value
 
-    def simple_evaluate_side(self, board, rules, side):
+    def simple_evaluate_side(self, pos, side):
         """
-        Percorre todas as peças de um lado (por exemplo, "MAGENTA" ou "YELLOW")
+        Percorre todas as peças de um lado (0 = YELLOW, 1 = MAGENTA)
         e soma os seus valores (baseados no rank).
 
-        Se a peça for um Elephant, verifica se algum Rat adversário pode capturá-lo.
+        Se a peça for um Elephant, verifica se o Rat adversário pode capturá-lo.
         Se estiver ameaçado, reduz o valor efetivo do Elephant (por exemplo, 50% do seu rank).
         """
         score = 0
-        # Determina a cor do adversário
-        opponent_side = "MAGENTA" if side == "YELLOW" else "YELLOW"
-        for piece in board.pieces[side]:
-            if piece.state == "Dead":
+        # Casas para onde o Rat adversário pode ir
+        rat_targets = [to for _, to in pos.piece_moves((1 - side) * 8 + RAT)]
+        for kind in range(8):
+            sq = pos.squares[side * 8 + kind]
+            if sq < 0:
                 continue
-            value = piece.rank  # valor base é o rank da peça
-            if piece.name == "Elephant":
-                threatened = False
-                # Verifica se algum Rat adversário ameaça este Elephant
-                for enemy in board.pieces[opponent_side]:
-                    if enemy.name == "Rat" and enemy.state != "Dead":
-                        enemy_moves = rules.move(enemy)
-                        if piece.position in enemy_moves:
-                            threatened = True
-                            break
-                if threatened:
-                    value *= 0.5  # reduz o valor efetivo do Elephant
+            value = RANKS[kind]  # valor base é o rank da peça
+            if kind == ELEPHANT and sq in rat_targets:
+                value *= 0.5  # reduz o valor efetivo do Elephant
             score += value
         return score
 
-    def corrida(self, board, side):
+    def corrida(self, pos, side):
+        """
+        Verifica se a peça mais próxima da toca adversária é do lado `side`
+        (só distâncias de Manhattan: não vê rio, armadilhas nem bloqueios).
+        Devolve (é do lado, distância).
+        """
         livre = False
         min_dis = 100
-        opponent_side = "MAGENTA" if side == "YELLOW" else "YELLOW"
-        for p in board.pieces[side] + board.pieces[opponent_side]:
-            if self.man_dis(p, side) < min_dis:
-                if p.side == side:
-                    livre = True
-                else:
-                    livre = False
-            elif self.man_dis(p, side) == min_dis:
-                if p.side == opponent_side:
-                    livre = False
+        for p, sq in enumerate(pos.squares):
+            if sq < 0:
+                continue
+            dis = self.man_dis(sq, side)
+            if dis < min_dis:
+                min_dis = dis
+                livre = p >> 3 == side
+            elif dis == min_dis and p >> 3 != side:
+                livre = False
         return (livre, min_dis)
 
-    def man_dis(self, piece, side):
-        den = (9, 4) if side == "YELLOW" else (1, 4)
-        xd, yd = den
-        x, y = piece.position
-        return abs(xd - x) + abs(yd - y)
+    def man_dis(self, sq, side):
+        """Distância de Manhattan da casa `sq` até à toca adversária de `side`."""
+        den = DEN_SQUARE[1 - side]
+        return abs(den // COLS - sq // COLS) + abs(den % COLS - sq % COLS)
 
-    def complex_evaluate_side(self, board, rules, side):
+    def complex_evaluate_side(self, pos, side):
         """
-        Percorre todas as peças de um lado (por exemplo, "MAGENTA" ou "YELLOW")
-        e soma os seus valores (baseados no rank).
-
-        Se a peça for um Elephant, verifica se algum Rat adversário pode capturá-lo.
-        Se estiver ameaçado, reduz o valor efetivo do Elephant (por exemplo, 50% do seu rank).
+        Percorre todas as peças de um lado (0 = YELLOW, 1 = MAGENTA)
+        e soma os seus valores (baseados no rank), com bónus para peças especiais,
+        mobilidade, proximidade à toca adversária e controlo das armadilhas adversárias.
         """
         bonus_L_T = 5  # Bônus para Lion/Tiger
         bonus_R = 6  # Bônus para Rat (ou penalidade se o Rat adversário for uma ameaça)
@@ -285,53 +967,39 @@ class AI:
         positional_weight = 0.2  # Bônus por redução de distância ao den adversário
         score = 0
         possible_moves = set()
-        # Define as armadilhas de cada lado (exemplo)
-        traps = {(1, 3), (2, 4), (1, 5)} if side == "YELLOW" else {(9, 3), (8, 4), (9, 5)}
-        # Determina a cor do adversário e os dens
-        opponent_side = "MAGENTA" if side == "YELLOW" else "YELLOW"
-        den_adversario = (1, 4) if side == "YELLOW" else (9, 4)
-
-        # Função para calcular um bônus baseado na distância ao den adversário
-        def bonus_dist(pos):
-            # Quanto menor a distância, maior o bônus (por exemplo, bônus máximo de 10)
-            dist = abs(pos[0] - den_adversario[0]) + abs(pos[1] - den_adversario[1])
-            return max(0, 10 - dist) * positional_weight
-
-        for piece in board.pieces[side]:
-            if piece.state == "Dead":
+        # Armadilhas adversárias (à volta da toca do adversário)
+        traps = SIDE_TRAPS[1 - side]
+
+        for kind in range(8):
+            p = side * 8 + kind
+            sq = pos.squares[p]
+            if sq < 0:
                 continue
-            value = piece.rank  # Valor base é o rank
+            value = RANKS[kind]  # Valor base é o rank
             # Adiciona bônus para peças especiais
-            if piece.name in ["Lion", "Tiger"]:
+            if kind == LION or kind == TIGER:
                 value += bonus_L_T
-            elif piece.name == "Rat":
-                # Exemplo: se o Rat adversário estiver ativo, pode receber um bônus
+            elif kind == RAT:
                 value += bonus_R
 
-            # Se a peça estiver sob ataque, reduz seu valor
-            if piece.state == "under_attack":
+            # Se a peça estiver sob ataque (state "under_attack" do Rules.move), reduz seu valor
+            moves = pos.piece_moves(p)
+            if pos.threatened(p, moves):
                 value /= 2
 
             # Adiciona bônus baseado na mobilidade (número de movimentos legais disponíveis)
-            moves = rules.move(piece)
-            mobility_bonus = len(moves) * mobility_factor
-            value += mobility_bonus
+            value += len(moves) * mobility_factor
 
             # Adiciona bônus por proximidade ao den adversário
-            value += bonus_dist(piece.position)
+            # (quanto menor a distância, maior o bônus, até um máximo de 10)
+            value += max(0, 10 - self.man_dis(sq, side)) * positional_weight
 
             score += value
             # Acumula os movimentos possíveis para avaliar o controle do território
-            possible_moves = possible_moves | set(moves)
+            possible_moves.update(to for _, to in moves)
 
-        # Penaliza se as armadilhas adversárias estiverem sob controle (exemplo simples)
+        # Bónus se as armadilhas adversárias estiverem sob controle (exemplo simples)
         if traps & possible_moves:
             score += 5
 
-        # Se houver uma "corrida" para o den (função corrida já definida), pode ajustar o score
-        if self.corrida(board, side)[0]:
-            score = 10000
-
         return score
-
-
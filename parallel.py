@@ -0,0 +1,317 @@
+# parallel.py
+"""
+Pesquisa paralela para a dificuldade 'hard', com um pool de processos que é
+criado uma vez e mantido entre jogadas.
+
+Cada processo tem um AI próprio ligado a uma tabela de transposição em memória
+partilhada (SharedTranspositionTable), por isso o que um processo aprende fica
+disponível para os outros e para as jogadas seguintes. As posições são enviadas
+codificadas (Position.encode). Há dois modos:
+
+    - divisão da raiz (get_move_hard): a primeira jogada da raiz é pesquisada
+      sozinha e só depois as outras são repartidas pelos processos; o melhor
+      valor até ao momento (alpha) é partilhado através de memória partilhada,
+      cada processo começa com o alpha atual e volta a lê-lo em cada
+      verificação do SearchController, estreitando a janela da pesquisa.
+    - Lazy SMP (get_move_hard_iterative): todos os processos fazem iterative
+      deepening sobre a mesma raiz, com profundidades desfasadas, e ajudam-se
+      uns aos outros através da tabela partilhada. Fica o resultado da maior
+      profundidade completa.
+
+Para o MCTS (get_move_mcts) há também dois modos:
+
+    - paralelização na raiz: cada processo faz um MCTS independente (com a sua
+      árvore e a sua semente) e os resultados juntam-se somando as visitas de
+      cada jogada da raiz.
+    - paralelização nas folhas: a árvore fica no processo principal, que
+      seleciona K folhas por processo com perda virtual e envia cada lote de K
+      rollouts numa só chamada (para amortizar a comunicação).
+"""
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+STOP_POLL = 0.05  # segundos entre verificações de um pedido de paragem (Lazy SMP)
+
+# Progresso do Lazy SMP em memória partilhada: maior profundidade completa, o seu
+# valor e jogada (codificada), e depois os nós de cada processo
+PROGRESS_DEPTH, PROGRESS_SCORE, PROGRESS_MOVE, PROGRESS_NODES = range(4)
+
+# Estado de cada processo do pool (criado por _init_worker)
+_worker_ai = None
+_shared_alpha = None
+_worker_search_id = None
+_shared_stop = None
+_shared_progress = None
+
+
+def _init_worker(shared_alpha, shared_stop, shared_progress, tt_name, tt_size_mb, ai_options):
+    global _worker_ai, _shared_alpha, _shared_stop, _shared_progress
+    from minimax import AI
+    from transposition import SharedTranspositionTable
+    # As mesmas opções do AI principal (técnicas ligadas, tablebase, caches); o livro só se usa na raiz
+    _worker_ai = AI(tt_size_mb=0, verbose=False, book=None, **ai_options)
+    _worker_ai.transposition_table = SharedTranspositionTable(tt_size_mb, name=tt_name)
+    _shared_alpha = shared_alpha
+    _shared_stop = shared_stop
+    _shared_progress = shared_progress
+
+
+def _start_search(search_id, limits):
+    """Prepara o AI do processo para uma pesquisa (idade da tabela, killers, limites)."""
+    global _worker_search_id
+    from search import SearchController
+    ai = _worker_ai
+    if search_id != _worker_search_id:
+        _worker_search_id = search_id
+        ai.transposition_table.age = search_id & 0xFF
+        ai.move_orderer.new_search()
+    ai.controller = SearchController(limits)
+    ai.controller.shared_stop = _shared_stop
+    return ai
+
+
+def _search_root_move(encoded, move, depth, search_id):
+    """
+    Pesquisa uma jogada da raiz com a janela (alpha partilhado, +inf); o alpha
+    é relido durante a pesquisa (SearchController.root_alpha). Devolve (jogada,
+    valor, exato, nós); se o valor não bater o alpha é só um limite superior.
+    """
+    from evaluation import IncrementalPosition
+    ai = _start_search(search_id, None)
+    pos = IncrementalPosition.decode(encoded)
+    controller = ai.controller
+    controller.shared_alpha = _shared_alpha
+    controller.root_alpha = _shared_alpha.value
+    pos.make_move(move)
+    score = -ai.negamax(pos, depth - 1, float('-inf'), -controller.root_alpha, 1)
+    exact = score > controller.root_alpha
+    if exact:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return move, score, exact, ai.controller.nodes
+
+
+def _lazy_smp_search(encoded, index, limits, search_id):
+    """
+    Iterative deepening completo num processo auxiliar. Os processos ímpares
+    começam uma profundidade acima para não pesquisarem todos o mesmo ao mesmo
+    tempo. Devolve (profundidade completa, jogada, valor, nós).
+    """
+    from position import Position
+    ai = _start_search(search_id, limits)
+    ai.on_depth = lambda depth, score, nodes, elapsed, pv: _publish_depth(index, depth, score, nodes, pv)
+    move = ai.iterative_deepening(Position.decode(encoded), verbose=False, start_depth=1 + index % 2)
+    return ai.completed_depth, move, ai.best_score, ai.controller.nodes
+
+
+def _publish_depth(index, depth, score, nodes, pv):
+    """Regista uma profundidade completa deste processo (ver ParallelSearch.lazy_smp)."""
+    from transposition import encode_move
+    progress = _shared_progress
+    with progress.get_lock():
+        progress[PROGRESS_NODES + index] = nodes
+        if depth > progress[PROGRESS_DEPTH] and pv:
+            progress[PROGRESS_DEPTH] = depth
+            progress[PROGRESS_SCORE] = score
+            progress[PROGRESS_MOVE] = encode_move(pv[0])
+
+
+def _mcts_root_search(encoded, iterations, time_limit, seed):
+    """MCTS independente no processo. Devolve ([(jogada, visitas, vitórias)], iterações, profundidade)."""
+    from mcts import MCTS
+    from position import Position
+    random.seed(seed)
+    if _worker_ai.mcts is None:
+        _worker_ai.mcts = MCTS()
+    mcts = _worker_ai.mcts
+    mcts.search(Position.decode(encoded), iterations, time_limit)
+    return mcts.root_statistics(), mcts.iterations, mcts.max_depth
+
+
+def _mcts_rollouts(encoded_positions, seed):
+    """Um rollout por posição. Devolve a lista dos vencedores (None = empate)."""
+    from mcts import rollout
+    from position import Position
+    random.seed(seed)
+    return [rollout(Position.decode(encoded)) for encoded in encoded_positions]
+
+
+class ParallelSearch:
+    def __init__(self, workers, tt_size_mb=16, ai_options=None):
+        from transposition import SharedTranspositionTable
+        self.workers = workers
+        self.ai_options = ai_options or {}  # argumentos do AI de cada processo (AI.worker_options)
+        self.shared_alpha = multiprocessing.Value('d', float('-inf'))
+        self.shared_stop = multiprocessing.Value('b', 0)  # pedido de paragem para todos os processos
+        self.shared_progress = multiprocessing.Array('d', PROGRESS_NODES + workers)
+        self.transposition_table = SharedTranspositionTable(tt_size_mb)
+        self.pool = None
+        self.search_id = 0
+        self.nodes = 0
+        self.completed_depth = 0
+
+    def _ensure_pool(self):
+        # O pool é criado uma vez e mantido entre jogadas
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(self.shared_alpha, self.shared_stop, self.shared_progress, self.transposition_table.name,
+                          self.transposition_table.size_mb, self.ai_options))
+        return self.pool
+
+    def root_split(self, root, moves, depth):
+        """
+        Pesquisa as jogadas da raiz (pela ordem dada): a primeira sozinha, para
+        fixar o alpha, e as restantes em paralelo. Devolve (melhor jogada, valor).
+        """
+        pool = self._ensure_pool()
+        self.search_id += 1
+        self.transposition_table.age = self.search_id & 0xFF
+        self.shared_stop.value = 0
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = float('-inf')
+        encoded = root.encode()
+        first = pool.submit(_search_root_move, encoded, moves[0], depth, self.search_id).result()
+        futures = [pool.submit(_search_root_move, encoded, move, depth, self.search_id) for move in moves[1:]]
+        best_move, best_score = None, float('-inf')
+        self.nodes = 0
+        # Resultados pela ordem de submissão: em caso de empate fica a jogada melhor ordenada
+        for move, score, exact, nodes in [first] + [future.result() for future in futures]:
+            self.nodes += nodes
+            if exact and score > best_score:
+                best_move, best_score = move, score
+        self.completed_depth = depth
+        return best_move, best_score
+
+    def lazy_smp(self, root, limits, controller=None, on_depth=None):
+        """
+        Lazy SMP: um iterative deepening por processo, todos com a tabela partilhada
+        e os mesmos limites (o limite de nós é dividido pelos processos). Com
+        `controller` os processos param quando ele for parado (controller.stop(),
+        p.ex. de outra thread) ou quando os limites dele se esgotarem (podem mudar
+        durante a pesquisa, como num ponderhit). `on_depth(profundidade, valor,
+        jogada, nós, segundos)` é chamado sempre que um processo completa uma
+        profundidade maior do que as anteriores.
+        Devolve (jogada, valor) da maior profundidade completa.
+        """
+        from search import SearchLimits
+        from transposition import decode_move
+        pool = self._ensure_pool()
+        self.search_id += 1
+        self.transposition_table.age = self.search_id & 0xFF
+        self.shared_stop.value = 0
+        progress = self.shared_progress
+        with progress.get_lock():
+            progress[:] = [0.0] * len(progress)
+        nodes = None if limits.nodes is None else max(1, limits.nodes // self.workers)
+        worker_limits = SearchLimits(limits.depth, limits.soft_time, limits.hard_time, nodes)
+        encoded = root.encode()
+        start = time.time()
+        futures = [pool.submit(_lazy_smp_search, encoded, i, worker_limits, self.search_id)
+                   for i in range(self.workers)]
+        reported = 0
+        while True:
+            polling = controller is not None or on_depth is not None
+            pending = wait(futures, timeout=STOP_POLL).not_done if polling else ()
+            with progress.get_lock():
+                depth, score, move = (int(progress[PROGRESS_DEPTH]), progress[PROGRESS_SCORE],
+                                      int(progress[PROGRESS_MOVE]))
+                searched = int(sum(progress[PROGRESS_NODES:]))
+            if on_depth is not None and depth > reported:
+                reported = depth
+                on_depth(depth, score, decode_move(move), searched, time.time() - start)
+            if not pending:
+                break
+            if controller is not None:
+                depth_limit = controller.limits.depth
+                if (controller.stopped or controller.out_of_budget()
+                        or (depth_limit is not None and depth >= depth_limit)):
+                    self.stop()
+        best = (-1, None, float('-inf'))
+        self.nodes = 0
+        for future in futures:
+            depth, move, score, nodes = future.result()
+            self.nodes += nodes
+            if move is not None and depth > best[0]:
+                best = (depth, move, score)
+        self.completed_depth = best[0]
+        return best[1], best[2]
+
+    def mcts_root(self, root, iterations=None, time_limit=None):
+        """
+        MCTS com paralelização na raiz: um MCTS por processo (as iterações são
+        divididas pelos processos), juntando as visitas de cada jogada da raiz.
+        Devolve (jogada, taxa de vitórias); o total de playouts fica em `nodes`.
+        """
+        pool = self._ensure_pool()
+        encoded = root.encode()
+        per_worker = None if iterations is None else max(1, iterations // self.workers)
+        futures = [pool.submit(_mcts_root_search, encoded, per_worker, time_limit, random.getrandbits(32))
+                   for _ in range(self.workers)]
+        visits, wins = {}, {}
+        self.nodes = 0
+        self.completed_depth = 0
+        for future in futures:
+            statistics, playouts, depth = future.result()
+            self.nodes += playouts
+            self.completed_depth = max(self.completed_depth, depth)
+            for move, move_visits, move_wins in statistics:
+                visits[move] = visits.get(move, 0) + move_visits
+                wins[move] = wins.get(move, 0.0) + move_wins
+        if not visits:
+            return None, None
+        best = max(visits, key=visits.get)
+        return best, wins[best] / visits[best]
+
+    def mcts_leaf(self, mcts, root, iterations=None, time_limit=None, batch=8):
+        """
+        MCTS com paralelização nas folhas: a árvore `mcts` fica neste processo e
+        os rollouts são feitos pelos processos do pool, em lotes de `batch`
+        posições por chamada. As folhas de um lote são escolhidas com perda
+        virtual. Devolve a jogada mais visitada; os playouts ficam em `nodes`.
+        """
+        pool = self._ensure_pool()
+        mcts.set_root(root)
+        if not mcts.root.untried and not mcts.root.children:
+            return None
+        start = time.time()
+        self.nodes = 0
+        while True:
+            if iterations is not None and self.nodes >= iterations:
+                break
+            if time_limit is not None and time.time() - start >= time_limit:
+                break
+            count = self.workers * batch
+            if iterations is not None:
+                count = min(count, iterations - self.nodes)
+            leaves = []
+            for _ in range(count):
+                node, pos = mcts.select(root, virtual_loss=True)
+                if node.winner is not None:
+                    mcts.backpropagate(node, node.winner, counted=True)
+                else:
+                    leaves.append((node, pos.encode()))
+            chunks = [leaves[i:i + batch] for i in range(0, len(leaves), batch)]
+            futures = [pool.submit(_mcts_rollouts, [encoded for _, encoded in chunk], random.getrandbits(32))
+                       for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                for (node, _), winner in zip(chunk, future.result()):
+                    mcts.backpropagate(node, winner, counted=True)
+            self.nodes += count
+            mcts.iterations = self.nodes
+        self.completed_depth = mcts.max_depth
+        best = mcts.root.most_visited()
+        return best.move if best is not None else None
+
+    def stop(self):
+        """Pede às pesquisas em curso nos processos para pararem (na próxima verificação do relógio)."""
+        self.shared_stop.value = 1
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.transposition_table.close()
@@ -0,0 +1,266 @@
+# perft.py
+"""
+Perft: conta as folhas da árvore de jogadas até uma profundidade, para medir a
+velocidade do gerador de jogadas e confirmar que gera exatamente as jogadas
+legais. Uma posição em que um dos lados já entrou na toca adversária é o fim do
+jogo e não tem jogadas.
+
+As contagens de perft_positions.json foram geradas pela própria Position. Desde
+que o Rules.move passou a usar as tabelas de position.py deixou de ser uma
+verificação independente; por isso o --reference usa um gerador à parte
+(reference_moves), escrito casa a casa sobre o Board e as Piece, como o Rules
+original, que tem de dar as mesmas contagens. O --rules conta com o
+Rules.move, o gerador que o jogo usa (com o Board, as Piece e os states), para
+medir e confirmar esse caminho.
+
+Exemplos:
+    python perft.py 4                      posição inicial, profundidade 4
+    python perft.py 3 --divide             contagem por jogada da raiz
+    python perft.py 3 --reference          usa o gerador de referência (Board/Piece)
+    python perft.py 3 --rules              usa o Rules.move
+    python perft.py --check                compara com as contagens de perft_positions.json
+    python perft.py --check --reference --max-depth 3
+    python perft.py --check --rules --max-depth 3
+"""
+import argparse
+import json
+import os
+import time
+
+from position import Position, from_notation, to_notation, move_to_text, SIDES
+from rules import Rules
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_positions.json")
+
+
+def perft(pos, depth):
+    """Número de folhas à profundidade `depth` (gerador da Position)."""
+    if depth == 0:
+        return 1
+    if pos.winner() is not None:
+        return 0
+    moves = pos.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        token = pos.make_move(move)
+        nodes += perft(pos, depth - 1)
+        pos.unmake_move(token)
+    return nodes
+
+
+def divide(pos, depth):
+    """Contagem de folhas por jogada da raiz: {(origem, destino): folhas}."""
+    result = {}
+    for move in pos.legal_moves():
+        token = pos.make_move(move)
+        result[move] = perft(pos, depth - 1)
+        pos.unmake_move(token)
+    return result
+
+
+def _terrain_grid():
+    """Terreno do Board (rio "~", armadilhas "%", tocas "&"), sem as peças por cima."""
+    from board import Board
+    grid = Board.__new__(Board)
+    grid.rows, grid.cols = 10, 8
+    grid.board = [['_' for _ in range(grid.cols)] for _ in range(grid.rows)]
+    grid._river()
+    grid._traps()
+    grid._dens()
+    return grid.board
+
+
+def _reference_captures(attacker, defender, terrain):
+    """Regras de captura escritas sobre o Board (as mesmas de Rules.can_captures)."""
+    a_cell = terrain[attacker.position[0]][attacker.position[1]]
+    d_cell = terrain[defender.position[0]][defender.position[1]]
+    if attacker.name == "Rat":
+        if a_cell == "~":
+            return defender.name == "Rat" and d_cell == "~"
+        if d_cell == "~":
+            return False
+        if defender.name == "Elephant":
+            return True
+    if defender.name == "Rat" and d_cell == "~":
+        return False
+    if attacker.name == "Elephant" and defender.name == "Rat":
+        return False
+    a_hp = 1 if a_cell == "%" else attacker.rank
+    d_hp = 1 if d_cell == "%" else defender.rank
+    return a_hp >= d_hp
+
+
+def reference_moves(piece, occupants, terrain):
+    """
+    Destinos da peça calculados casa a casa sobre o Board, sem as tabelas de
+    position.py: é o gerador de referência para confirmar o da Position.
+    `occupants` é {(linha, coluna): peça viva}.
+    """
+    own_den = (1, 4) if piece.color == "YELLOW" else (9, 4)
+    r, c = piece.position
+    moves = []
+    for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        nr, nc = r + dr, c + dc
+        if not (1 <= nr <= 9 and 1 <= nc <= 7) or (nr, nc) == own_den:
+            continue
+        if terrain[nr][nc] == "~" and piece.name != "Rat":
+            if piece.name not in ("Lion", "Tiger"):
+                continue
+            # Salto sobre o rio, a não ser que haja um Rat (a única peça que lá pode estar) no caminho
+            blocked = False
+            while 1 <= nr <= 9 and 1 <= nc <= 7 and terrain[nr][nc] == "~":
+                blocked = blocked or (nr, nc) in occupants
+                nr, nc = nr + dr, nc + dc
+            if blocked or not (1 <= nr <= 9 and 1 <= nc <= 7) or (nr, nc) == own_den:
+                continue
+        target = occupants.get((nr, nc))
+        if target is None or (target.color != piece.color and _reference_captures(piece, target, terrain)):
+            moves.append((nr, nc))
+    return moves
+
+
+def _occupants(board):
+    """{(linha, coluna): peça viva} do Board."""
+    return {piece.position: piece for pieces in board.pieces.values() for piece in pieces
+            if piece.state != "Dead"}
+
+
+def _den_reached(occupants):
+    """Verdadeiro se uma peça está na toca adversária (fim do jogo)."""
+    return any(position == ((9, 4) if piece.color == "YELLOW" else (1, 4))
+               for position, piece in occupants.items())
+
+
+def perft_reference(board, color, depth, terrain=None):
+    """Mesma contagem, com o gerador de referência sobre as peças do Board."""
+    if depth == 0:
+        return 1
+    if terrain is None:
+        terrain = _terrain_grid()
+    occupants = _occupants(board)
+    if _den_reached(occupants):
+        return 0
+    opponent = "MAGENTA" if color == "YELLOW" else "YELLOW"
+    nodes = 0
+    for piece in board.pieces[color]:
+        if piece.state == "Dead":
+            continue
+        for target in reference_moves(piece, occupants, terrain):
+            if depth == 1:
+                nodes += 1
+                continue
+            victim = occupants.get(target)
+            if victim is not None:
+                victim_state = victim.state
+                victim.state = "Dead"
+            origin = piece.position
+            piece.position = target
+            nodes += perft_reference(board, opponent, depth - 1, terrain)
+            piece.position = origin
+            if victim is not None:
+                victim.state = victim_state
+    return nodes
+
+
+def perft_rules(board, color, depth, rules=None):
+    """
+    Mesma contagem, com o Rules.move sobre o Board; as jogadas são aplicadas
+    como no jogo (a peça capturada fica "Dead" e o trap_effects atualiza o hp).
+    """
+    if depth == 0:
+        return 1
+    if rules is None:
+        rules = Rules(board)
+    occupants = _occupants(board)
+    if _den_reached(occupants):
+        return 0
+    opponent = "MAGENTA" if color == "YELLOW" else "YELLOW"
+    nodes = 0
+    for piece in board.pieces[color]:
+        targets = rules.move(piece)
+        if depth == 1:
+            nodes += len(targets)
+            continue
+        for target in targets:
+            victim = occupants.get(target)
+            if victim is not None:
+                victim_state = victim.state
+                victim.state = "Dead"
+            origin = piece.position
+            piece.position = target
+            rules.trap_effects()
+            nodes += perft_rules(board, opponent, depth - 1, rules)
+            piece.position = origin
+            if victim is not None:
+                victim.state = victim_state
+            rules.trap_effects()
+    return nodes
+
+
+def run(pos, depth, generator="position"):
+    """Devolve (folhas, segundos); `generator` é "position", "reference" ou "rules"."""
+    start = time.perf_counter()
+    if generator == "reference":
+        nodes = perft_reference(pos.to_board(), SIDES[pos.side], depth)
+    elif generator == "rules":
+        nodes = perft_rules(pos.to_board(), SIDES[pos.side], depth)
+    else:
+        nodes = perft(pos, depth)
+    return nodes, time.perf_counter() - start
+
+
+def check(fixture=FIXTURE, generator="position", max_depth=None):
+    """Compara as contagens com as do ficheiro de referência. Devolve True se todas batem."""
+    with open(fixture, encoding="utf-8") as f:
+        cases = json.load(f)
+    ok = True
+    total_nodes, total_time = 0, 0.0
+    for case in cases:
+        pos = from_notation(case["position"])
+        for depth, expected in sorted((int(d), n) for d, n in case["perft"].items()):
+            if max_depth is not None and depth > max_depth:
+                continue
+            nodes, elapsed = run(pos, depth, generator)
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == expected else f"ERRO (esperado {expected})"
+            ok = ok and nodes == expected
+            print(f"{case['name']:<20} profundidade {depth}: {nodes:>10} {status}")
+    if total_time:
+        print(f"{total_nodes} folhas em {total_time:.2f}s ({total_nodes / total_time:.0f} folhas/s)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft do gerador de jogadas.")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--position", help="posição na notação de position.to_notation (por omissão a inicial)")
+    parser.add_argument("--divide", action="store_true", help="mostra as folhas por jogada da raiz")
+    generators = parser.add_mutually_exclusive_group()
+    generators.add_argument("--reference", action="store_const", dest="generator", const="reference",
+                            default="position", help="usa o gerador de referência sobre o Board em vez da Position")
+    generators.add_argument("--rules", action="store_const", dest="generator", const="rules",
+                            help="usa o Rules.move sobre o Board em vez da Position")
+    parser.add_argument("--check", action="store_true", help="compara com o ficheiro de referência")
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--max-depth", type=int, help="com --check, ignora profundidades maiores")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if check(args.fixture, args.generator, args.max_depth) else 1)
+
+    pos = from_notation(args.position) if args.position else Position()
+    print(to_notation(pos))
+    if args.divide:
+        for move, nodes in sorted(divide(pos, args.depth).items(), key=lambda x: move_to_text(x[0])):
+            print(f"{move_to_text(move)}: {nodes}")
+    for depth in range(1, args.depth + 1):
+        nodes, elapsed = run(pos, depth, args.generator)
+        nps = nodes / elapsed if elapsed else 0.0
+        print(f"profundidade {depth}: {nodes} folhas em {elapsed:.3f}s ({nps:.0f} folhas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+# position.py
+"""
+Representação compacta do tabuleiro usada apenas pela pesquisa da IA.
+
+O Board/Piece continuam a ser a camada de apresentação (matriz com as cores do
+colorama, estados das peças, etc.). Aqui uma posição é só:
+    - squares: lista fixa com 16 casas (uma por peça, -1 se a peça morreu)
+    - board:   lista fixa com 63 entradas (índice da peça em cada casa, ou -1)
+    - side:    lado a jogar (0 = YELLOW / Player1, 1 = MAGENTA / Player2)
+    - hash:    chave de Zobrist de 64 bits, atualizada a cada jogada
+O terreno (rio, armadilhas, tocas) é uma tabela estática partilhada.
+"""
+import random
+
+ROWS = 9
+COLS = 7
+NUM_SQUARES = ROWS * COLS
+
+LAND, WATER, TRAP, DEN = 0, 1, 2, 3
+
+YELLOW, MAGENTA = 0, 1
+SIDES = ("YELLOW", "MAGENTA")
+PLAYERS = ("Player1", "Player2")
+
+# Ordem igual à de piece.get_pieces(); o índice de uma peça é side * 8 + kind.
+PIECE_NAMES = ("Elephant", "Lion", "Tiger", "Leopard", "Wolf", "Dog", "Cat", "Rat")
+ELEPHANT, LION, TIGER, LEOPARD, WOLF, DOG, CAT, RAT = range(8)
+RANKS = (8, 7, 6, 5, 4, 3, 2, 1)
+NUM_PIECES = 16
+
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def square(r, c):
+    """Converte coordenadas do Board (linha 1-9, coluna 1-7) num índice 0-62."""
+    return (r - 1) * COLS + (c - 1)
+
+
+def coords(sq):
+    """Inverso de square()."""
+    return sq // COLS + 1, sq % COLS + 1
+
+
+def on_board(r, c):
+    return 1 <= r <= ROWS and 1 <= c <= COLS
+
+
+# Mesmas casas que Board._river(), Board._traps() e Board._dens()
+RIVER = {(4, 2), (4, 3), (4, 5), (4, 6),
+         (5, 2), (5, 3), (5, 5), (5, 6),
+         (6, 2), (6, 3), (6, 5), (6, 6)}
+TRAPS = {(1, 3), (2, 4), (1, 5),
+         (9, 3), (8, 4), (9, 5)}
+
+# Toca de cada lado (a própria, onde o lado não pode entrar)
+DEN_SQUARE = (square(1, 4), square(9, 4))
+# Armadilhas que rodeiam a toca de cada lado
+SIDE_TRAPS = (frozenset(square(r, c) for r, c in ((1, 3), (2, 4), (1, 5))),
+              frozenset(square(r, c) for r, c in ((9, 3), (8, 4), (9, 5))))
+
+
+def _build_terrain():
+    terrain = [LAND] * NUM_SQUARES
+    for r, c in RIVER:
+        terrain[square(r, c)] = WATER
+    for r, c in TRAPS:
+        terrain[square(r, c)] = TRAP
+    for sq in DEN_SQUARE:
+        terrain[sq] = DEN
+    return tuple(terrain)
+
+
+TERRAIN = _build_terrain()
+
+
+# --- Tabelas de geração de jogadas (calculadas uma vez, no import) ---
+
+# Vizinhos ortogonais de cada casa: tuplos (direção, casa)
+NEIGHBORS = tuple(
+    tuple((d, square(coords(sq)[0] + dr, coords(sq)[1] + dc))
+          for d, (dr, dc) in enumerate(DIRECTIONS)
+          if on_board(coords(sq)[0] + dr, coords(sq)[1] + dc))
+    for sq in range(NUM_SQUARES))
+
+
+def _jump(sq, d):
+    """Casa de aterragem e casas de rio atravessadas num salto a partir de `sq`."""
+    dr, dc = DIRECTIONS[d]
+    r, c = coords(sq)
+    r, c = r + dr, c + dc
+    crossed = []
+    while on_board(r, c) and TERRAIN[square(r, c)] == WATER:
+        crossed.append(square(r, c))
+        r, c = r + dr, c + dc
+    if not on_board(r, c):
+        return None
+    return square(r, c), tuple(crossed)
+
+
+def _build_targets(side):
+    """
+    Destinos possíveis de cada casa, por lado, sem contar com a ocupação:
+        steps: peças normais (não entram no rio)
+        rat:   o Rat (pode entrar no rio)
+        jumps: Lion/Tiger, como (destino, casas de rio atravessadas)
+    Em todos os casos a própria toca fica excluída.
+    """
+    own_den = DEN_SQUARE[side]
+    steps, rat, jumps = [], [], []
+    for sq in range(NUM_SQUARES):
+        s, r, j = [], [], []
+        for d, to in NEIGHBORS[sq]:
+            if to == own_den:
+                continue
+            r.append(to)
+            if TERRAIN[to] != WATER:
+                s.append(to)
+                j.append((to, ()))
+            else:
+                landing = _jump(sq, d)
+                if landing is not None and landing[0] != own_den:
+                    j.append(landing)
+        steps.append(tuple(s))
+        rat.append(tuple(r))
+        jumps.append(tuple(j))
+    return tuple(steps), tuple(rat), tuple(jumps)
+
+
+STEP_TARGETS, RAT_TARGETS, JUMP_TARGETS = zip(_build_targets(YELLOW), _build_targets(MAGENTA))
+
+
+def _captures(a_kind, d_kind, a_terrain, d_terrain):
+    """Mesmas regras de Rules.can_captures (lados diferentes)."""
+    a_water = a_terrain == WATER
+    d_water = d_terrain == WATER
+    if a_kind == RAT:
+        if a_water:
+            return d_kind == RAT and d_water
+        if d_water:
+            return False
+        if d_kind == ELEPHANT:
+            return True
+    if d_kind == RAT and d_water:
+        return False
+    if a_kind == ELEPHANT and d_kind == RAT:
+        return False
+    a_hp = 1 if a_terrain == TRAP else RANKS[a_kind]
+    d_hp = 1 if d_terrain == TRAP else RANKS[d_kind]
+    return a_hp >= d_hp
+
+
+# CAPTURES[atacante][defensor][terreno do atacante * 4 + terreno do defensor]
+CAPTURES = tuple(
+    tuple(tuple(_captures(a, d, ta, td) for ta in range(4) for td in range(4)) for d in range(8))
+    for a in range(8))
+
+
+def _start_squares():
+    from piece import get_pieces
+    pieces = get_pieces()
+    squares = [-1] * NUM_PIECES
+    for side, color in enumerate(SIDES):
+        for piece in pieces[color]:
+            squares[side * 8 + PIECE_NAMES.index(piece.name)] = square(*piece.position)
+    return tuple(squares)
+
+
+START_SQUARES = _start_squares()
+
+
+# --- Chaves de Zobrist (64 bits) ---
+# Um número aleatório por peça (tipo x lado) e casa, mais um para o lado a jogar.
+# A semente é fixa para que as chaves sejam iguais em todos os processos.
+_zobrist_random = random.Random(20250301)
+ZOBRIST = tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(NUM_SQUARES))
+                for _ in range(NUM_PIECES))
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+
+
+class Position:
+    __slots__ = ("squares", "board", "side", "hash")
+
+    def __init__(self, squares=START_SQUARES, side=YELLOW):
+        self.squares = list(squares)
+        self.board = [-1] * NUM_SQUARES
+        for p, sq in enumerate(self.squares):
+            if sq >= 0:
+                self.board[sq] = p
+        self.side = side
+        self.hash = self.compute_hash()
+
+    def compute_hash(self):
+        """
+        Calcula a chave de Zobrist do zero. Durante a pesquisa a chave é mantida
+        de forma incremental por make_move/unmake_move; isto serve só para
+        inicializar e para verificar (debug).
+        """
+        h = ZOBRIST_SIDE if self.side else 0
+        for p, sq in enumerate(self.squares):
+            if sq >= 0:
+                h ^= ZOBRIST[p][sq]
+        return h
+
+    @classmethod
+    def from_board(cls, board, color):
+        """
+        Constrói a posição a partir de um Board; `color` ("YELLOW"/"MAGENTA")
+        é o lado que vai jogar.
+        """
+        squares = [-1] * NUM_PIECES
+        for side, side_color in enumerate(SIDES):
+            for piece in board.pieces[side_color]:
+                if piece.state != "Dead":
+                    squares[side * 8 + PIECE_NAMES.index(piece.name)] = square(*piece.position)
+        return cls(squares, SIDES.index(color))
+
+    def to_board(self):
+        """Cria um Board (camada de apresentação) com esta posição."""
+        from board import Board
+        board = Board()
+        for side, color in enumerate(SIDES):
+            for piece in board.pieces[color]:
+                sq = self.squares[side * 8 + PIECE_NAMES.index(piece.name)]
+                if sq < 0:
+                    piece.state = "Dead"
+                else:
+                    piece.position = coords(sq)
+                    piece.hp = self.hp(side * 8 + PIECE_NAMES.index(piece.name))
+        board._place_pieces()
+        return board
+
+    def encode(self):
+        """Codificação compacta (tuplo de 17 inteiros) para enviar a outros processos."""
+        return tuple(self.squares) + (self.side,)
+
+    @classmethod
+    def decode(cls, encoded):
+        return cls(encoded[:NUM_PIECES], encoded[NUM_PIECES])
+
+    def copy(self):
+        new = Position.__new__(Position)
+        new.squares = self.squares[:]
+        new.board = self.board[:]
+        new.side = self.side
+        new.hash = self.hash
+        return new
+
+    def hp(self, p):
+        """Numa armadilha qualquer peça fica com hp 1 (ver Rules.trap_effects)."""
+        return 1 if TERRAIN[self.squares[p]] == TRAP else RANKS[p & 7]
+
+    def can_capture(self, attacker, defender):
+        """Mesmas regras de Rules.can_captures, mas com o terreno da tabela."""
+        if attacker >> 3 == defender >> 3:
+            return False
+        return CAPTURES[attacker & 7][defender & 7][
+            TERRAIN[self.squares[attacker]] * 4 + TERRAIN[self.squares[defender]]]
+
+    def threatened(self, p, moves):
+        """
+        Estado "under_attack" que o Rules.move dá à peça p ao gerar as suas
+        jogadas `moves`: há um inimigo ao lado de um dos destinos que a captura.
+        """
+        board = self.board
+        for _, to in moves:
+            for _, nsq in NEIGHBORS[to]:
+                enemy = board[nsq]
+                if enemy >= 0 and self.can_capture(enemy, p):
+                    return True
+        return False
+
+    def piece_moves(self, p):
+        """Lista de jogadas (origem, destino) da peça p."""
+        moves = []
+        self._add_moves(p, moves)
+        return moves
+
+    def legal_moves(self, side=None):
+        """Todas as jogadas de um lado (por omissão, o lado a jogar), numa lista plana."""
+        if side is None:
+            side = self.side
+        moves = []
+        squares = self.squares
+        for p in range(side * 8, side * 8 + 8):
+            if squares[p] >= 0:
+                self._add_moves(p, moves)
+        return moves
+
+    def _add_moves(self, p, moves):
+        frm = self.squares[p]
+        if frm < 0:
+            return
+        board = self.board
+        side = p >> 3
+        kind = p & 7
+        captures = CAPTURES[kind]
+        frm_terrain = TERRAIN[frm] * 4
+        if kind == LION or kind == TIGER:
+            for to, crossed in JUMP_TARGETS[side][frm]:
+                blocked = False
+                for sq in crossed:
+                    # Só o Rat pode estar no rio
+                    if board[sq] >= 0:
+                        blocked = True
+                        break
+                if blocked:
+                    continue
+                occupant = board[to]
+                if occupant < 0:
+                    moves.append((frm, to))
+                elif occupant >> 3 != side and captures[occupant & 7][frm_terrain + TERRAIN[to]]:
+                    moves.append((frm, to))
+            return
+        targets = RAT_TARGETS[side][frm] if kind == RAT else STEP_TARGETS[side][frm]
+        for to in targets:
+            occupant = board[to]
+            if occupant < 0:
+                moves.append((frm, to))
+            elif occupant >> 3 != side and captures[occupant & 7][frm_terrain + TERRAIN[to]]:
+                moves.append((frm, to))
+
+    def make_move(self, move):
+        """
+        Faz a jogada na própria posição e devolve o token para a desfazer.
+        O hp das peças depende só da casa onde estão (armadilha ou não), por isso
+        repor a casa repõe também o efeito das armadilhas.
+        """
+        frm, to = move
+        board = self.board
+        p = board[frm]
+        victim = board[to]
+        old_hash = self.hash
+        h = old_hash ^ ZOBRIST_SIDE ^ ZOBRIST[p][frm] ^ ZOBRIST[p][to]
+        if victim >= 0:
+            self.squares[victim] = -1
+            h ^= ZOBRIST[victim][to]
+        board[frm] = -1
+        board[to] = p
+        self.squares[p] = to
+        self.side ^= 1
+        self.hash = h
+        return frm, to, victim, old_hash
+
+    def unmake_move(self, token):
+        """Desfaz a jogada feita por make_move (captura, lado a jogar e chave incluídos)."""
+        frm, to, victim, old_hash = token
+        board = self.board
+        p = board[to]
+        board[frm] = p
+        self.squares[p] = frm
+        board[to] = victim
+        if victim >= 0:
+            self.squares[victim] = to
+        self.side ^= 1
+        self.hash = old_hash
+
+    def make_null_move(self):
+        """Passa a vez sem mexer nenhuma peça (para o null-move pruning)."""
+        old_hash = self.hash
+        self.side ^= 1
+        self.hash = old_hash ^ ZOBRIST_SIDE
+        return old_hash
+
+    def unmake_null_move(self, token):
+        self.side ^= 1
+        self.hash = token
+
+    def winner(self):
+        """Lado que entrou na toca adversária, ou None (ver Rules.check_victory)."""
+        for side in (YELLOW, MAGENTA):
+            if self.board[DEN_SQUARE[side]] >= 0:
+                return self.board[DEN_SQUARE[side]] >> 3
+        return None
+
+
+# Letra de cada peça na notação (maiúsculas = YELLOW, minúsculas = MAGENTA);
+# o Leopard é "P" (panther) para não se confundir com o Lion.
+PIECE_LETTERS = "ELTPWDCR"
+
+
+def to_notation(pos):
+    """
+    Notação de texto de uma posição, ao estilo FEN: as linhas 1 a 9 separadas
+    por "/", com dígitos para casas vazias seguidas, e depois o lado a jogar
+    ("y" ou "m"). A posição inicial do jogo é
+    "L5T/1D3C1/R1P1W1E/7/7/5rl/e1w1p2/1c3d1/t6 y".
+    """
+    rows = []
+    for r in range(1, ROWS + 1):
+        row = ""
+        empty = 0
+        for c in range(1, COLS + 1):
+            p = pos.board[square(r, c)]
+            if p < 0:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            letter = PIECE_LETTERS[p & 7]
+            row += letter if p >> 3 == YELLOW else letter.lower()
+        if empty:
+            row += str(empty)
+        rows.append(row)
+    return "/".join(rows) + (" y" if pos.side == YELLOW else " m")
+
+
+def from_notation(text):
+    """Inverso de to_notation. Lança ValueError se a notação for inválida."""
+    try:
+        placement, side = text.split()
+    except ValueError:
+        raise ValueError(f"Notação inválida: {text!r}")
+    rows = placement.split("/")
+    if len(rows) != ROWS or side not in ("y", "m"):
+        raise ValueError(f"Notação inválida: {text!r}")
+    squares = [-1] * NUM_PIECES
+    for r, row in enumerate(rows, start=1):
+        c = 1
+        for char in row:
+            if char.isdigit():
+                c += int(char)
+                continue
+            kind = PIECE_LETTERS.find(char.upper())
+            if kind < 0 or c > COLS:
+                raise ValueError(f"Notação inválida: {text!r}")
+            p = (YELLOW if char.isupper() else MAGENTA) * 8 + kind
+            if squares[p] >= 0:
+                raise ValueError(f"Peça repetida na notação: {char}")
+            squares[p] = square(r, c)
+            c += 1
+        if c != COLS + 1:
+            raise ValueError(f"Notação inválida: {text!r}")
+    return Position(squares, YELLOW if side == "y" else MAGENTA)
+
+
+def move_to_text(move):
+    """Texto de uma jogada (origem, destino): coluna (A-G) e linha de cada casa, p.ex. "A3A4"."""
+    (r1, c1), (r2, c2) = coords(move[0]), coords(move[1])
+    return f"{chr(ord('A') + c1 - 1)}{r1}{chr(ord('A') + c2 - 1)}{r2}"
+
+
+def move_from_text(text):
+    """Inverso de move_to_text. Lança ValueError se o texto for inválido."""
+    text = text.strip().upper()
+    if len(text) != 4 or not text[1].isdigit() or not text[3].isdigit():
+        raise ValueError(f"Jogada inválida: {text!r}")
+    c1, r1, c2, r2 = ord(text[0]) - ord('A') + 1, int(text[1]), ord(text[2]) - ord('A') + 1, int(text[3])
+    if not (on_board(r1, c1) and on_board(r2, c2)):
+        raise ValueError(f"Jogada inválida: {text!r}")
+    return square(r1, c1), square(r2, c2)
+
+
+def piece_index(piece):
+    """Índice (0-15) de um Piece do Board na representação compacta."""
+    return SIDES.index(piece.color) * 8 + PIECE_NAMES.index(piece.name)
+
+
+def to_board_move(board, move):
+    """Converte uma jogada (origem, destino) em (Piece, (linha, coluna)) do Board."""
+    frm, to = move
+    position = coords(frm)
+    for pieces in board.pieces.values():
+        for piece in pieces:
+            if piece.position == position and piece.state != "Dead":
+                return piece, coords(to)
+    return None
@@ -0,0 +1,221 @@
+# profiling.py
+"""
+Perfil da IA por etapas: quanto tempo da pesquisa vai para a geração de
+jogadas, make/unmake, hashing, avaliação, ordenação, tabela de transposição,
+tablebase de finais e conversões Board/Position.
+
+Os temporizadores só existem enquanto o StageProfiler está ativo: os métodos
+de cada etapa são substituídos por versões cronometradas e repostos no fim, por
+isso o motor não paga nada fora deste modo. O tempo é exclusivo (uma avaliação
+que gera jogadas conta essas jogadas em "movegen") e o que não pertence a
+nenhuma etapa fica em "search". As medições incluem o custo dos próprios
+temporizadores; servem para comparar etapas e versões, não como tempo absoluto.
+
+Exemplos:
+    python profiling.py --depth 5
+    python profiling.py --depth 6 --collapsed stacks.txt   (para flamegraph.pl / speedscope)
+    python profiling.py --depth 5 --cprofile hard.prof     (para pstats / snakeviz)
+"""
+import argparse
+import cProfile
+import json
+import pstats
+import time
+
+from board import Board
+from evaluation import IncrementalPosition
+from minimax import AI, HARD_DEPTH
+from perft import FIXTURE
+from position import Position, from_notation, SIDES
+from rules import Rules
+from search import MoveOrderer
+from tablebase import Tablebase
+from transposition import TranspositionTable, EvaluationCache
+
+# (classe, método, etapa)
+STAGES = (
+    (AI, "__init__", "setup"),
+    (Board, "clone", "board"),
+    (Board, "_place_pieces", "board"),
+    (Position, "from_board", "board"),
+    (Position, "to_board", "board"),
+    (Rules, "move", "rules"),
+    (Position, "legal_moves", "movegen"),
+    (Position, "piece_moves", "movegen"),
+    (Position, "make_move", "make/unmake"),
+    (Position, "unmake_move", "make/unmake"),
+    (Position, "make_null_move", "make/unmake"),
+    (Position, "unmake_null_move", "make/unmake"),
+    (Position, "copy", "make/unmake"),
+    (IncrementalPosition, "legal_moves", "movegen"),
+    (IncrementalPosition, "piece_moves", "movegen"),
+    (IncrementalPosition, "make_move", "make/unmake"),
+    (IncrementalPosition, "unmake_move", "make/unmake"),
+    (IncrementalPosition, "copy", "make/unmake"),
+    (IncrementalPosition, "_refresh", "incremental"),
+    (AI, "compute_hash", "hash"),
+    (Position, "compute_hash", "hash"),
+    (AI, "evaluate_position", "eval"),
+    (AI, "get_ordered_moves", "ordering"),
+    (MoveOrderer, "order", "ordering"),
+    (TranspositionTable, "probe", "tt"),
+    (TranspositionTable, "store", "tt"),
+    (EvaluationCache, "probe", "evalcache"),
+    (EvaluationCache, "store", "evalcache"),
+    (Tablebase, "probe", "tablebase"),
+)
+
+
+class StageProfiler:
+    """
+    Temporizadores por etapa. Usa-se como contexto:
+
+        profiler = StageProfiler()
+        with profiler:
+            ai.get_move_hard(board, rules, color)
+        print(profiler.report())
+    """
+
+    def __init__(self, stages=STAGES, root="search"):
+        self.stages = stages
+        self.root = root
+        self.times = {}   # etapa -> segundos (exclusivos)
+        self.calls = {}   # etapa -> número de chamadas
+        self.stacks = {}  # "search;eval;movegen" -> segundos (para flamegraphs)
+        self._stack = [root]
+        self._last = None
+        self._originals = []
+
+    def _charge(self, now):
+        # O tempo desde o último evento pertence à etapa no topo da pilha
+        stack = self._stack
+        elapsed = now - self._last
+        self._last = now
+        top = stack[-1]
+        self.times[top] = self.times.get(top, 0.0) + elapsed
+        key = ";".join(stack)
+        self.stacks[key] = self.stacks.get(key, 0.0) + elapsed
+
+    def _wrap(self, func, stage):
+        profiler = self
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            stack = profiler._stack
+            nested = stack[-1] == stage  # p.ex. legal_moves -> piece_moves: uma só etapa
+            if not nested:
+                profiler._charge(clock())
+                stack.append(stage)
+                profiler.calls[stage] = profiler.calls.get(stage, 0) + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if not nested:
+                    profiler._charge(clock())
+                    stack.pop()
+        return timed
+
+    def start(self):
+        for owner, name, stage in self.stages:
+            original = owner.__dict__[name]
+            if isinstance(original, classmethod):
+                timed = classmethod(self._wrap(original.__func__, stage))
+            elif isinstance(original, staticmethod):
+                timed = staticmethod(self._wrap(original.__func__, stage))
+            else:
+                timed = self._wrap(original, stage)
+            self._originals.append((owner, name, original))
+            setattr(owner, name, timed)
+        self._last = time.perf_counter()
+
+    def stop(self):
+        self._charge(time.perf_counter())
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def total(self):
+        return sum(self.times.values())
+
+    def report(self):
+        """Tabela com o tempo exclusivo de cada etapa."""
+        total = self.total() or 1.0
+        lines = [f"{'etapa':<14}{'chamadas':>12}{'tempo (s)':>12}{'%':>8}{'µs/chamada':>13}"]
+        for stage, seconds in sorted(self.times.items(), key=lambda x: -x[1]):
+            calls = self.calls.get(stage, 0)
+            per_call = seconds / calls * 1e6 if calls else 0.0
+            lines.append(f"{stage:<14}{calls:>12}{seconds:>12.3f}{seconds / total * 100:>7.1f}%{per_call:>13.2f}")
+        lines.append(f"{'total':<14}{'':>12}{self.total():>12.3f}")
+        return "\n".join(lines)
+
+    def write_collapsed(self, path):
+        """Pilhas no formato "a;b;c microssegundos" (flamegraph.pl, speedscope, inferno)."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                micros = int(seconds * 1e6)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+
+def load_positions(fixture=FIXTURE, notation=None):
+    """Posições a analisar: uma dada em notação, ou as do ficheiro do perft."""
+    if notation:
+        return [("posição", from_notation(notation))]
+    with open(fixture, encoding="utf-8") as f:
+        return [(case["name"], from_notation(case["position"])) for case in json.load(f)]
+
+
+def run_positions(positions, depth, tt_size_mb=16):
+    """Pesquisa cada posição com get_move_hard à profundidade dada. Devolve os nós pesquisados."""
+    nodes = 0
+    for _, pos in positions:
+        ai = AI(tt_size_mb=tt_size_mb, verbose=False, book=None)  # a posição inicial está no livro
+        board = pos.to_board()
+        ai.get_move_hard(board, Rules(board), SIDES[pos.side], depth=depth)
+        nodes += ai.last_stats.nodes
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil da IA por etapas.")
+    parser.add_argument("--depth", type=int, default=HARD_DEPTH)
+    parser.add_argument("--position", help="posição na notação de position.to_notation")
+    parser.add_argument("--fixture", default=FIXTURE, help="posições a usar (por omissão as do perft)")
+    parser.add_argument("--tt", type=int, default=16, help="tamanho da tabela de transposição em MB")
+    parser.add_argument("--collapsed", help="ficheiro para as pilhas por etapa (flamegraph)")
+    parser.add_argument("--cprofile", help="ficheiro para o perfil do cProfile (pstats)")
+    args = parser.parse_args()
+
+    positions = load_positions(args.fixture, args.position)
+
+    start = time.perf_counter()
+    nodes = run_positions(positions, args.depth, args.tt)
+    elapsed = time.perf_counter() - start
+    print(f"{len(positions)} posições, profundidade {args.depth}: {nodes} nós em {elapsed:.2f}s "
+          f"({nodes / elapsed:.0f} nós/s sem temporizadores)")
+
+    profiler = StageProfiler()
+    with profiler:
+        run_positions(positions, args.depth, args.tt)
+    print(profiler.report())
+    if args.collapsed:
+        profiler.write_collapsed(args.collapsed)
+
+    if args.cprofile:
+        # Sem os temporizadores por etapa, para não distorcer o perfil
+        profile = cProfile.Profile()
+        profile.runcall(run_positions, positions, args.depth, args.tt)
+        profile.dump_stats(args.cprofile)
+        pstats.Stats(profile).sort_stats("tottime").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
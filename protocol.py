@@ -0,0 +1,346 @@
+# protocol.py
+"""
+Protocolo de texto para usar o motor a partir de outros programas, ao estilo do
+UCI/USI. Serve o stdin/stdout ou, com --port, ligações TCP em 127.0.0.1 (várias
+sessões ao mesmo tempo, com asyncio).
+
+Comandos (um por linha):
+    uci                              identificação e opções; termina com "uciok"
+    isready                          responde "readyok"
+    setoption name Hash value <MB>   tamanho da tabela de transposição
+    ucinewgame                       começa com tabelas novas
+    position startpos [moves A3A4 ...]
+    position notation <casas> <y|m> [moves ...]   (notação de position.to_notation)
+    go [depth N] [movetime MS] [nodes N] [infinite] [ponder]
+    stop                             para a pesquisa (responde com o bestmove)
+    ponderhit                        o adversário jogou a jogada prevista: o "go ponder"
+                                     passa a ter os limites que foram dados
+    d                                mostra a posição atual (info string)
+    quit
+
+Durante a pesquisa é escrita uma linha por profundidade completa
+    info depth 6 score cp -220 nodes 18311 nps 40120 time 456 pv A3A4 G7G6 ...
+e no fim "bestmove A3A4 ponder G7G6" (ou "bestmove (none)", p.ex. se um dos
+lados já entrou na toca). Com "infinite" e
+"ponder" o bestmove só sai depois do stop/ponderhit, como no UCI.
+
+As pesquisas correm em threads, fora do ciclo de eventos, por isso o "stop" é
+lido logo e a pesquisa para na verificação seguinte do SearchController (a
+espera pelo fim também não bloqueia o ciclo, nem as outras sessões). Com
+--workers N as sessões partilham um pool de processos (Lazy SMP) por tamanho
+de Hash, já aquecido; só corre uma pesquisa paralela de cada vez e as outras
+esperam pela vez (um stop enquanto esperam responde logo).
+
+Exemplos:
+    python protocol.py
+    python protocol.py --port 7777 --workers 4
+"""
+import argparse
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from minimax import AI, HARD_DEPTH
+from parallel import ParallelSearch, STOP_POLL
+from position import Position, from_notation, to_notation, move_from_text, move_to_text
+from search import SearchController, SearchLimits, MAX_PLY
+
+ENGINE_NAME = "Jungle EIACD"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7777
+UNLIMITED_DEPTH = MAX_PLY // 2  # profundidade máxima de "go infinite" / "go ponder"
+
+
+class EngineServer:
+    """
+    Estado partilhado pelas sessões: threads das pesquisas e, com workers > 1,
+    os pools de processos (um por tamanho da tabela partilhada).
+    """
+
+    def __init__(self, workers=1, tt_size_mb=16):
+        self.workers = workers
+        self.tt_size_mb = tt_size_mb
+        self.executor = ThreadPoolExecutor()
+        self.parallel_searches = {}  # tamanho da tabela em MB -> ParallelSearch
+        self.pool_lock = threading.Lock()  # uma pesquisa paralela de cada vez
+
+    def new_ai(self, tt_size_mb=None):
+        tt_size_mb = tt_size_mb or self.tt_size_mb
+        ai = AI(tt_size_mb=tt_size_mb, workers=self.workers, verbose=False)
+        if self.workers > 1:
+            search = self.parallel_searches.get(tt_size_mb)
+            if search is None:
+                search = ParallelSearch(self.workers, tt_size_mb, ai.worker_options)
+                self.parallel_searches[tt_size_mb] = search
+            ai.parallel_search = search
+        return ai
+
+    def close(self):
+        self.executor.shutdown()
+        for search in self.parallel_searches.values():
+            search.close()
+
+
+class EngineSession:
+    """
+    Uma ligação (ou o stdin/stdout). `send` escreve uma linha de resposta e
+    tem de poder ser chamada de outras threads.
+    """
+
+    def __init__(self, server, send):
+        self.server = server
+        self.send = send
+        self.tt_size_mb = server.tt_size_mb
+        self.ai = server.new_ai()
+        self.pos = Position()
+        self.controller = None     # SearchController da pesquisa em curso
+        self.search = None         # Future da pesquisa em curso
+        self.ponder_limits = None  # limites a aplicar no ponderhit
+        self.release = threading.Event()  # com "infinite"/"ponder", o bestmove espera por isto
+
+    async def handle(self, line):
+        """Executa um comando. Devolve False quando a sessão deve terminar."""
+        words = line.split()
+        if not words:
+            return True
+        handler = getattr(self, "cmd_" + words[0], None)
+        if handler is None:
+            self.send(f"info string comando desconhecido: {words[0]}")
+            return True
+        try:
+            return await handler(words[1:]) is not False
+        except ValueError as error:
+            self.send(f"info string erro: {error}")
+            return True
+
+    def searching(self):
+        return self.search is not None and not self.search.done()
+
+    async def stop_search(self):
+        """Para a pesquisa em curso (se houver) e espera pelo bestmove, sem bloquear o ciclo de eventos."""
+        if self.searching():
+            self.controller.stop()
+            self.release.set()
+            await asyncio.wrap_future(self.search)
+
+    def _replace_ai(self):
+        self.ai.parallel_search = None  # o pool é do servidor
+        self.ai.close()
+        self.ai = self.server.new_ai(self.tt_size_mb)
+
+    async def close(self):
+        await self.stop_search()
+        self.ai.parallel_search = None
+        self.ai.close()
+
+    # --- Comandos ---
+
+    async def cmd_uci(self, args):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send("id author EIACD")
+        self.send(f"option name Hash type spin default {self.server.tt_size_mb} min 1 max 1024")
+        self.send("uciok")
+
+    async def cmd_isready(self, args):
+        self.send("readyok")
+
+    async def cmd_setoption(self, args):
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        if name.strip().lower() != "name hash":
+            raise ValueError(f"opção desconhecida: {text}")
+        size_mb = int(value)
+        if not 1 <= size_mb <= 1024:
+            raise ValueError(f"Hash fora do intervalo 1-1024: {size_mb}")
+        await self.stop_search()
+        self.tt_size_mb = size_mb
+        self._replace_ai()
+
+    async def cmd_ucinewgame(self, args):
+        await self.stop_search()
+        self._replace_ai()
+        self.pos = Position()
+
+    async def cmd_position(self, args):
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup == ["startpos"]:
+            pos = Position()
+        elif setup and setup[0] == "notation":
+            pos = from_notation(" ".join(setup[1:]))
+        else:
+            raise ValueError("position startpos|notation <casas> <y|m> [moves ...]")
+        for text in moves:
+            move = move_from_text(text)
+            if pos.winner() is not None or move not in pos.legal_moves():
+                raise ValueError(f"jogada ilegal: {text}")
+            pos.make_move(move)
+        await self.stop_search()
+        self.pos = pos
+
+    async def cmd_d(self, args):
+        self.send(f"info string {to_notation(self.pos)}")
+
+    async def cmd_go(self, args):
+        if self.searching():
+            raise ValueError("já há uma pesquisa em curso")
+        options, flags = {}, set()
+        i = 0
+        while i < len(args):
+            word = args[i]
+            if word in ("depth", "movetime", "nodes") and i + 1 < len(args):
+                options[word] = int(args[i + 1])
+                i += 2
+            elif word in ("infinite", "ponder"):
+                flags.add(word)
+                i += 1
+            else:
+                raise ValueError(f"parâmetro desconhecido do go: {word}")
+        movetime = options["movetime"] / 1000 if "movetime" in options else None
+        limits = SearchLimits(depth=options.get("depth"), soft_time=movetime, hard_time=movetime,
+                              nodes=options.get("nodes"))
+        if not options and not flags:
+            limits.depth = HARD_DEPTH
+        self.ponder_limits = limits if "ponder" in flags else None
+        if flags:
+            limits = SearchLimits(depth=UNLIMITED_DEPTH)
+            self.release.clear()
+        else:
+            self.release.set()
+        self.controller = SearchController(limits)
+        self.search = self.server.executor.submit(self._run_search, self.pos.copy(), self.controller)
+
+    async def cmd_ponderhit(self, args):
+        limits = self.ponder_limits
+        if not self.searching() or limits is None:
+            return
+        # Os limites contam a partir de agora (o tempo de ponder foi ganho)
+        controller = self.controller
+        elapsed = controller.elapsed()
+        controller.limits = SearchLimits(
+            depth=limits.depth,
+            soft_time=None if limits.soft_time is None else elapsed + limits.soft_time,
+            hard_time=None if limits.hard_time is None else elapsed + limits.hard_time,
+            nodes=None if limits.nodes is None else controller.nodes + limits.nodes)
+        if limits.depth is not None and self.ai.completed_depth >= limits.depth:
+            controller.stop()
+        self.ponder_limits = None
+        self.release.set()
+
+    async def cmd_stop(self, args):
+        await self.stop_search()
+
+    async def cmd_quit(self, args):
+        return False
+
+    # --- Pesquisa (corre numa thread do executor) ---
+
+    def _info(self, depth, score, nodes, elapsed, pv):
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        self.send(f"info depth {depth} score cp {round(score * 100)} nodes {nodes} nps {nps} "
+                  f"time {int(elapsed * 1000)} pv {' '.join(move_to_text(m) for m in pv)}")
+
+    def _run_search(self, pos, controller):
+        ai = self.ai
+        ai.on_depth = self._info
+        move = None
+        try:
+            if pos.winner() is not None:
+                ai.last_pv = []  # o jogo já acabou: não há jogada (bestmove (none))
+            elif ai.workers > 1:
+                # Espera pela vez no pool partilhado, mas desiste se a pesquisa for parada
+                lock = self.server.pool_lock
+                acquired = False
+                while not acquired and not controller.stopped:
+                    acquired = lock.acquire(timeout=STOP_POLL)
+                if acquired:
+                    try:
+                        move = ai.search_position(pos, controller)
+                    finally:
+                        lock.release()
+                else:
+                    # Parada antes de começar: a primeira jogada da ordenação (capturas primeiro)
+                    moves = ai.get_ordered_moves(pos)
+                    move = moves[0] if moves else None
+                    ai.last_pv = []
+            else:
+                move = ai.search_position(pos, controller)
+        except Exception as error:  # a sessão continua, mas o cliente tem de saber
+            self.send(f"info string erro na pesquisa: {error!r}")
+        self.release.wait()
+        pv = ai.last_pv
+        ponder = f" ponder {move_to_text(pv[1])}" if move and len(pv) > 1 and pv[0] == move else ""
+        self.send(f"bestmove {move_to_text(move) if move else '(none)'}{ponder}")
+
+
+async def serve_stdio(server):
+    """Uma sessão no stdin/stdout (termina com quit ou fim do stdin)."""
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()
+
+    def send(line):
+        with lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    session = EngineSession(server, send)
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line or not await session.handle(line):
+                break
+    finally:
+        await session.close()
+
+
+async def serve_tcp(server, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Aceita ligações TCP; cada ligação é uma sessão."""
+
+    async def client(reader, writer):
+        loop = asyncio.get_running_loop()
+
+        def send(line):
+            loop.call_soon_threadsafe(writer.write, (line + "\n").encode())
+
+        session = EngineSession(server, send)
+        try:
+            while True:
+                data = await reader.readline()
+                if not data or not await session.handle(data.decode(errors="replace")):
+                    break
+        finally:
+            await session.close()
+            await asyncio.sleep(0)  # deixa sair as últimas linhas (bestmove)
+            writer.close()
+
+    listener = await asyncio.start_server(client, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor com protocolo de texto (estilo UCI).")
+    parser.add_argument("--port", type=int, help=f"servir por TCP (p.ex. {DEFAULT_PORT}) em vez do stdin/stdout")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--workers", type=int, default=1, help="processos do pool partilhado (Lazy SMP)")
+    parser.add_argument("--hash", type=int, default=16, help="tabela de transposição em MB, por sessão")
+    args = parser.parse_args()
+
+    server = EngineServer(args.workers, args.hash)
+    try:
+        if args.port:
+            asyncio.run(serve_tcp(server, args.host, args.port))
+        else:
+            asyncio.run(serve_stdio(server))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# search.py
+"""
+Controlo da pesquisa da IA: limites de profundidade, tempo e nós.
+
+O SearchController conta os nós visitados e, de tempos a tempos, verifica os
+limites. Quando o limite "duro" (tempo ou nós) é atingido lança SearchAborted,
+que desfaz a iteração em curso até à raiz; o iterative deepening fica então com
+o resultado da última profundidade completa. O limite "suave" de tempo só
+decide se vale a pena começar mais uma profundidade.
+
+SearchStats junta as estatísticas de uma pesquisa (nós, tempo por
+profundidade, tabela de transposição, podas, variante principal) e pode ser
+escrito como uma linha JSON.
+"""
+import json
+import time
+
+
+class SearchAborted(Exception):
+    """A pesquisa excedeu o limite de tempo/nós ou foi mandada parar."""
+
+
+class SearchLimits:
+    def __init__(self, depth=None, soft_time=None, hard_time=None, nodes=None):
+        self.depth = depth          # profundidade máxima do iterative deepening
+        self.soft_time = soft_time  # segundos: não começa uma nova profundidade depois disto
+        self.hard_time = hard_time  # segundos: aborta a pesquisa a meio
+        self.nodes = nodes          # número máximo de nós
+
+
+class SearchController:
+    CHECK_EVERY = 64  # nós entre verificações do relógio
+
+    def __init__(self, limits=None):
+        self.limits = limits or SearchLimits()
+        self.start_time = time.time()
+        self.nodes = 0
+        self.qnodes = 0  # nós da pesquisa de quiescência (também contam em `nodes`)
+        self.tt_cutoffs = 0  # nós resolvidos pela tabela de transposição
+        self.cutoffs = 0  # podas beta
+        self.first_move_cutoffs = 0  # podas logo na primeira jogada (mede a ordenação)
+        self.tb_hits = 0  # nós resolvidos pela tablebase de finais
+        self.cache_hits = 0  # entradas encontradas na cache persistente
+        self.stopped = False
+        self.shared_stop = None  # multiprocessing.Value partilhado pelos processos da pesquisa paralela
+        # Divisão da raiz: alpha da raiz partilhado pelos processos (multiprocessing.Value) e o
+        # último valor lido, atualizado em cada verificação (ver AI.negamax no ply 1)
+        self.shared_alpha = None
+        self.root_alpha = float('-inf')
+        self._next_check = self._check_point()
+
+    def _check_point(self):
+        next_check = self.nodes + self.CHECK_EVERY
+        if self.limits.nodes is not None:
+            next_check = min(next_check, self.limits.nodes)
+        return next_check
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def count_node(self):
+        """Chamado em cada nó; lança SearchAborted se algum limite foi excedido."""
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._next_check = self._check_point()
+            if self.shared_alpha is not None:
+                self.root_alpha = self.shared_alpha.value
+            if self.stopped or self.out_of_budget():
+                self.stopped = True
+                raise SearchAborted()
+
+    def count_qnode(self):
+        self.qnodes += 1
+        self.count_node()
+
+    def out_of_budget(self):
+        if self.shared_stop is not None and self.shared_stop.value:
+            return True
+        limits = self.limits
+        if limits.nodes is not None and self.nodes >= limits.nodes:
+            return True
+        return limits.hard_time is not None and self.elapsed() >= limits.hard_time
+
+    def stop(self):
+        """Pede à pesquisa para parar (é abortada na próxima verificação)."""
+        self.stopped = True
+
+    def can_start_depth(self, depth):
+        limits = self.limits
+        if self.stopped or self.out_of_budget():
+            return False
+        if limits.depth is not None and depth > limits.depth:
+            return False
+        return limits.soft_time is None or self.elapsed() < limits.soft_time
+
+
+class SearchStats:
+    """Estatísticas de uma jogada do AI (ver AI.last_stats e a opção stats_sink)."""
+
+    def __init__(self, method, side):
+        self.method = method  # "easy", "medium", "hard", "iterative", "mcts" (ou "ponder" até ao ponderhit)
+        self.side = side
+        self.start_time = time.time()
+        self.time = 0.0
+        self.move = None
+        self.score = None
+        self.depth = 0
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.eval_probes = 0
+        self.eval_hits = 0
+        self.tt_cutoffs = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tb_hits = 0
+        self.cache_hits = 0
+        self.book = False  # jogada tirada do livro de aberturas (sem pesquisa)
+        self.ponder_hit = False  # pesquisa começada no tempo do adversário (ponderhit)
+        self.pv = []
+        self.depths = []  # uma entrada por profundidade completa
+        self.workers = 1  # processos usados (para os nós/s por processo)
+
+    def add_depth(self, depth, score, nodes, elapsed, pv):
+        """Regista uma iteração completa (`nodes` e `elapsed` são acumulados desde o início)."""
+        self.depths.append({"depth": depth, "score": score, "nodes": nodes, "time": round(elapsed, 4),
+                            "pv": pv})
+
+    def nps(self):
+        return self.nodes / self.time if self.time else 0.0
+
+    def branching_factor(self):
+        """Fator de ramificação efetivo: nós da última iteração / nós da anterior."""
+        if len(self.depths) < 2:
+            return None
+        counts = [d["nodes"] for d in self.depths]
+        last, previous = counts[-1] - counts[-2], counts[-2] - (counts[-3] if len(counts) > 2 else 0)
+        return last / previous if previous else None
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else None
+
+    def to_dict(self):
+        return {
+            "method": self.method,
+            "side": self.side,
+            "move": self.move,
+            "book": self.book,
+            "ponder_hit": self.ponder_hit,
+            "score": self.score,
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "time": round(self.time, 4),
+            "nps": round(self.nps()),
+            "nps_per_worker": round(self.nps() / self.workers),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.tt_hits / self.tt_probes if self.tt_probes else None,
+            "eval_probes": self.eval_probes,
+            "eval_hit_rate": self.eval_hits / self.eval_probes if self.eval_probes else None,
+            "tt_cutoffs": self.tt_cutoffs,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "tb_hits": self.tb_hits,
+            "cache_hits": self.cache_hits,
+            "branching_factor": self.branching_factor(),
+            "pv": self.pv,
+            "depths": self.depths,
+        }
+
+    def write(self, sink):
+        """Escreve as estatísticas como uma linha JSON num ficheiro aberto."""
+        sink.write(json.dumps(self.to_dict()) + "\n")
+        sink.flush()
+
+
+MAX_PLY = 128
+
+# Pontuações de ordenação (quanto maior, mais cedo a jogada é tentada)
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22
+
+
+class MoveOrderer:
+    """
+    Ordena as jogadas sem as fazer:
+        1. jogada da tabela de transposição
+        2. capturas por MVV-LVA (vítima de rank mais alto primeiro, depois atacante
+           de rank mais baixo)
+        3. as duas jogadas "killer" da ply (jogadas calmas que provocaram podas)
+        4. restantes jogadas pela tabela de histórico (origem x destino) ou, se forem
+           dados `quiet_scores` ({jogada: valor}), por esse valor
+    """
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * (64 * 64)
+
+    def new_search(self):
+        """Limpa as killers e reduz o histórico para dar mais peso à nova pesquisa."""
+        for slots in self.killers:
+            slots[0] = slots[1] = None
+        self.history = [h >> 1 for h in self.history]
+
+    def order(self, pos, moves, ply, tt_move=None, quiet_scores=None):
+        board = pos.board
+        history = self.history
+        killer1, killer2 = self.killers[ply] if ply < MAX_PLY else (None, None)
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            frm, to = move
+            victim = board[to]
+            if victim >= 0:
+                # RANKS[kind] == 8 - kind
+                return CAPTURE_SCORE + (8 - (victim & 7)) * 16 + (board[frm] & 7)
+            if move == killer1:
+                return KILLER_SCORE + 1
+            if move == killer2:
+                return KILLER_SCORE
+            if quiet_scores is not None:
+                return quiet_scores[move]
+            return history[frm * 64 + to]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def record_cutoff(self, pos, move, ply, depth):
+        """Regista uma jogada que provocou uma poda (só jogadas calmas)."""
+        frm, to = move
+        if pos.board[to] >= 0:
+            return
+        if ply < MAX_PLY:
+            slots = self.killers[ply]
+            if slots[0] != move:
+                slots[1] = slots[0]
+                slots[0] = move
+        self.history[frm * 64 + to] += depth * depth
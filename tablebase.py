@@ -0,0 +1,442 @@
+# tablebase.py
+"""
+Tablebase de finais com pouco material, calculada por análise retrógrada.
+
+Para cada conjunto de peças (a "assinatura", p.ex. Lion e Rat do YELLOW contra
+o Elephant do MAGENTA) todas as posições são resolvidas de trás para a frente:
+    - nível 0: posições perdidas para o lado a jogar (o adversário está na sua
+      toca, ou não tem jogadas)
+    - nível k: ganha em k plies quem tem uma jogada para uma posição perdida
+      em k-1; perde em k quem só tem jogadas para posições ganhas pelo
+      adversário, a mais longa em k-1
+As capturas levam a assinaturas com menos peças, que são calculadas antes. O
+que no fim não ficou resolvido é empate (nenhum lado consegue forçar a vitória).
+As regras são as da Position (as mesmas de Rules: rio, saltos, armadilhas e
+tocas), mas aplicadas com numpy a todas as posições de uma vez.
+
+Cada assinatura fica num ficheiro <assinatura>.jtb (p.ex. "LR_e.jtb") com um
+byte por posição: 2 bits com o resultado (WIN, LOSS, DRAW) e 6 bits com a
+distância em plies até ao fim do jogo (normalmente a entrada na toca), limitada
+a 63. O índice de uma posição é
+    lado a jogar * 63^n + soma(casa da k-ésima peça * 63^k)
+com as peças por ordem do seu índice. Na pesquisa os ficheiros são abertos com
+mmap, por isso só as páginas consultadas são lidas do disco.
+
+Exemplos:
+    python tablebase.py generate                  (todos os finais até 2 contra 1)
+    python tablebase.py generate --per-side 2 --max-pieces 4
+    python tablebase.py generate --signature LR_e
+    python tablebase.py probe "7/7/3e3/7/7/7/7/2L4/7 y"
+"""
+import argparse
+import itertools
+import mmap
+import os
+import time
+
+import numpy
+
+from position import (NUM_SQUARES, NUM_PIECES, YELLOW, MAGENTA, LION, TIGER, RAT, WATER, TERRAIN, DEN_SQUARE,
+                      STEP_TARGETS, RAT_TARGETS, JUMP_TARGETS, CAPTURES, PIECE_LETTERS, from_notation)
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase")
+EXTENSION = ".jtb"
+MAGIC = b"JTB1"
+
+# Resultado para o lado a jogar (0 = posição impossível / sem valor)
+UNKNOWN, WIN, LOSS, DRAW = 0, 1, 2, 3
+MAX_DISTANCE = 63  # a distância tem 6 bits
+MAX_SLOTS = 4      # uma peça tem no máximo 4 jogadas
+MAX_CROSSED = 3    # casas de rio atravessadas num salto
+
+
+def signature_name(signature):
+    """Nome de uma assinatura: peças do YELLOW em maiúsculas, "_", peças do MAGENTA em minúsculas."""
+    yellow = "".join(PIECE_LETTERS[p & 7] for p in signature if p >> 3 == YELLOW)
+    magenta = "".join(PIECE_LETTERS[p & 7].lower() for p in signature if p >> 3 == MAGENTA)
+    return yellow + "_" + magenta
+
+
+def parse_signature(name):
+    """Inverso de signature_name. Lança ValueError se o nome for inválido."""
+    try:
+        yellow, magenta = name.split("_")
+    except ValueError:
+        raise ValueError(f"Assinatura inválida: {name!r}")
+    signature = []
+    for side, letters in ((YELLOW, yellow.upper()), (MAGENTA, magenta.upper())):
+        for letter in letters:
+            kind = PIECE_LETTERS.find(letter)
+            if kind < 0:
+                raise ValueError(f"Assinatura inválida: {name!r}")
+            signature.append(side * 8 + kind)
+    if len(set(signature)) != len(signature):
+        raise ValueError(f"Peça repetida na assinatura: {name!r}")
+    return tuple(sorted(signature))
+
+
+def signatures(per_side, max_pieces=None):
+    """Todas as assinaturas com 1 a `per_side` peças de cada lado, das mais pequenas para as maiores."""
+    result = []
+    for yellow_count in range(1, per_side + 1):
+        for magenta_count in range(1, per_side + 1):
+            if max_pieces is not None and yellow_count + magenta_count > max_pieces:
+                continue
+            for yellow in itertools.combinations(range(8), yellow_count):
+                for magenta in itertools.combinations(range(8, 16), magenta_count):
+                    result.append(yellow + magenta)
+    result.sort(key=len)
+    return result
+
+
+def _build_slots():
+    """
+    SLOTS[side][kind]: (destinos, casas atravessadas) como arrays numpy
+    (MAX_SLOTS, 63) e (MAX_SLOTS, 63, MAX_CROSSED), com -1 onde não há jogada.
+    """
+    slots = []
+    for side in (YELLOW, MAGENTA):
+        per_kind = []
+        for kind in range(8):
+            targets = numpy.full((MAX_SLOTS, NUM_SQUARES), -1, dtype=numpy.int32)
+            crossed = numpy.full((MAX_SLOTS, NUM_SQUARES, MAX_CROSSED), -1, dtype=numpy.int32)
+            for sq in range(NUM_SQUARES):
+                if kind == LION or kind == TIGER:
+                    moves = JUMP_TARGETS[side][sq]
+                elif kind == RAT:
+                    moves = [(to, ()) for to in RAT_TARGETS[side][sq]]
+                else:
+                    moves = [(to, ()) for to in STEP_TARGETS[side][sq]]
+                for slot, (to, over) in enumerate(moves):
+                    targets[slot, sq] = to
+                    crossed[slot, sq, :len(over)] = over
+            per_kind.append((targets, crossed))
+        slots.append(per_kind)
+    return slots
+
+
+SLOTS = _build_slots()
+_TERRAIN = numpy.array(TERRAIN, dtype=numpy.int8)
+# CAPTURE_MATRIX[atacante][defensor][origem, destino]: a captura é permitida
+CAPTURE_MATRIX = tuple(
+    tuple(numpy.array([[CAPTURES[a][d][TERRAIN[frm] * 4 + TERRAIN[to]] for to in range(NUM_SQUARES)]
+                       for frm in range(NUM_SQUARES)], dtype=bool) for d in range(8))
+    for a in range(8))
+
+
+def pack(wdl, distance):
+    """Um byte por posição: resultado nos 2 bits baixos, distância (limitada a 63) nos outros 6."""
+    return (wdl.astype(numpy.uint8) | (numpy.minimum(distance, MAX_DISTANCE).astype(numpy.uint8) << 2))
+
+
+def unpack(codes):
+    codes = numpy.asarray(codes, dtype=numpy.uint8)
+    return (codes & 3).astype(numpy.int8), (codes >> 2).astype(numpy.int16)
+
+
+def _child_index(signature, removed, squares, mover, to):
+    """Índice (sem o lado a jogar) na assinatura sem a peça `removed`, com a peça `mover` em `to`."""
+    index = numpy.zeros(len(to), dtype=numpy.int64)
+    k = 0
+    for i, p in enumerate(signature):
+        if i == removed:
+            continue
+        index += (to if i == mover else squares[i]).astype(numpy.int64) * NUM_SQUARES ** k
+        k += 1
+    return index
+
+
+def solve(signature, solved, verbose=False):
+    """
+    Resolve todas as posições de uma assinatura. `solved` é um dicionário
+    assinatura -> (wdl, distância) com as assinaturas mais pequenas (as que
+    resultam de uma captura). Devolve os arrays (wdl, distância), com as
+    posições de YELLOW a jogar seguidas das de MAGENTA a jogar.
+    """
+    n = len(signature)
+    size = NUM_SQUARES ** n
+    index = numpy.arange(size, dtype=numpy.int64)
+    squares = [(index // NUM_SQUARES ** k % NUM_SQUARES).astype(numpy.int32) for k in range(n)]
+    sides = [p >> 3 for p in signature]
+    kinds = [p & 7 for p in signature]
+
+    # Posições possíveis: casas diferentes, ninguém na própria toca, só o Rat no rio
+    valid = numpy.ones(size, dtype=bool)
+    for i in range(n):
+        valid &= squares[i] != DEN_SQUARE[sides[i]]
+        if kinds[i] != RAT:
+            valid &= _TERRAIN[squares[i]] != WATER
+        for j in range(i + 1, n):
+            valid &= squares[i] != squares[j]
+    # in_den[side]: uma peça de `side` está na toca adversária (o jogo já acabou)
+    in_den = [numpy.zeros(size, dtype=bool), numpy.zeros(size, dtype=bool)]
+    for i in range(n):
+        in_den[sides[i]] |= squares[i] == DEN_SQUARE[1 - sides[i]]
+
+    wdl = numpy.zeros(2 * size, dtype=numpy.int8)
+    distance = numpy.zeros(2 * size, dtype=numpy.int16)
+    blocks = []
+    max_known = 0
+    for side in (YELLOW, MAGENTA):
+        # Com uma peça nossa na toca adversária a posição não acontece (o jogo acabou antes)
+        block_valid = valid & ~in_den[side]
+        lost = block_valid & in_den[1 - side]
+        moves = []
+        has_move = numpy.zeros(size, dtype=bool)
+        for i in range(n):
+            if sides[i] != side:
+                continue
+            targets, crossed = SLOTS[side][kinds[i]]
+            frm = squares[i]
+            for slot in range(MAX_SLOTS):
+                to = targets[slot][frm]
+                legal = block_valid & ~lost & (to >= 0)
+                if not legal.any():
+                    continue
+                safe_to = numpy.where(legal, to, 0)
+                captured = []
+                for j in range(n):
+                    if j == i:
+                        continue
+                    occupied = squares[j] == safe_to
+                    if sides[j] == side:
+                        legal &= ~occupied
+                    else:
+                        legal &= ~occupied | CAPTURE_MATRIX[kinds[i]][kinds[j]][frm, safe_to]
+                        captured.append((j, occupied))
+                    for c in range(MAX_CROSSED):
+                        over = crossed[slot][frm, c]
+                        legal &= ~((over >= 0) & (squares[j] == over))
+                if not legal.any():
+                    continue
+                quiet = legal.copy()
+                known_wdl = numpy.zeros(size, dtype=numpy.int8)
+                known_distance = numpy.zeros(size, dtype=numpy.int16)
+                for j, occupied in captured:
+                    hit = legal & occupied
+                    if not hit.any():
+                        continue
+                    quiet &= ~hit
+                    rest = signature[:j] + signature[j + 1:]
+                    if not any(p >> 3 == 1 - side for p in rest):
+                        known_wdl[hit] = LOSS  # o adversário ficou sem peças: não tem jogadas
+                        continue
+                    rows = numpy.nonzero(hit)[0]
+                    child = _child_index(signature, j, [s[rows] for s in squares], i, safe_to[rows])
+                    child += (1 - side) * NUM_SQUARES ** len(rest)
+                    child_wdl, child_distance = solved[rest]
+                    known_wdl[rows] = child_wdl[child]
+                    known_distance[rows] = child_distance[child]
+                max_known = max(max_known, int(known_distance.max()))
+                # Jogada sem captura: mesma assinatura, do outro lado a jogar
+                child = (1 - side) * size + index + (safe_to - frm).astype(numpy.int64) * NUM_SQUARES ** i
+                child[~quiet] = 0
+                moves.append((legal, quiet, child, known_wdl, known_distance))
+                has_move |= legal
+        start = side * size
+        dead = block_valid & (lost | ~has_move)
+        wdl[start:start + size][dead] = LOSS
+        blocks.append((start, block_valid, moves))
+
+    level = 0
+    while True:
+        level += 1
+        changed = 0
+        for start, block_valid, moves in blocks:
+            rows = numpy.nonzero(block_valid & (wdl[start:start + size] == UNKNOWN))[0]
+            if not len(rows):
+                continue
+            any_loss = numpy.zeros(len(rows), dtype=bool)
+            all_win = numpy.ones(len(rows), dtype=bool)
+            for legal, quiet, child, known_wdl, known_distance in moves:
+                legal, quiet = legal[rows], quiet[rows]
+                target = child[rows]
+                child_wdl = numpy.where(quiet, wdl[target], known_wdl[rows])
+                child_distance = numpy.where(quiet, distance[target], known_distance[rows])
+                # Só contam os filhos resolvidos em níveis anteriores
+                visible = child_distance < level
+                any_loss |= legal & (child_wdl == LOSS) & visible
+                all_win &= ~legal | ((child_wdl == WIN) & visible)
+            won = rows[any_loss] + start
+            lost = rows[~any_loss & all_win] + start
+            wdl[won] = WIN
+            wdl[lost] = LOSS
+            distance[won] = level
+            distance[lost] = level
+            changed += len(won) + len(lost)
+        if not changed and level > max_known + 1:
+            break
+    for start, block_valid, _ in blocks:
+        block = wdl[start:start + size]
+        block[block_valid & (block == UNKNOWN)] = DRAW
+    if verbose:
+        print(f"  {signature_name(signature)}: {level - 1} níveis, "
+              f"{int((wdl == WIN).sum())} ganhas, {int((wdl == LOSS).sum())} perdidas, "
+              f"{int((wdl == DRAW).sum())} empatadas")
+    return wdl, distance
+
+
+def table_path(directory, signature):
+    return os.path.join(directory, signature_name(signature) + EXTENSION)
+
+
+def write_table(path, signature, wdl, distance):
+    with open(path, "wb") as f:
+        f.write(MAGIC + bytes([len(signature)]) + bytes(signature))
+        f.write(pack(wdl, distance).tobytes())
+
+
+def read_table(path):
+    """Lê um ficheiro inteiro. Devolve (assinatura, wdl, distância)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"Ficheiro de tablebase inválido: {path}")
+    n = data[4]
+    signature = tuple(data[5:5 + n])
+    wdl, distance = unpack(numpy.frombuffer(data, dtype=numpy.uint8, offset=5 + n))
+    return signature, wdl, distance
+
+
+def generate(signature_list, directory=TABLEBASE_DIR, verbose=True):
+    """
+    Calcula e grava as assinaturas dadas (e as mais pequenas de que dependem,
+    se ainda não existirem no diretório).
+    """
+    os.makedirs(directory, exist_ok=True)
+    needed = set()
+    pending = list(signature_list)
+    while pending:
+        signature = pending.pop()
+        if signature in needed:
+            continue
+        needed.add(signature)
+        for j, p in enumerate(signature):
+            rest = signature[:j] + signature[j + 1:]
+            if any(q >> 3 == 1 - (p >> 3) for q in rest) and any(q >> 3 == p >> 3 for q in rest):
+                pending.append(rest)
+    solved = {}
+    for signature in sorted(needed, key=lambda s: (len(s), s)):
+        path = table_path(directory, signature)
+        if os.path.exists(path) and signature not in signature_list:
+            _, wdl, distance = read_table(path)
+        else:
+            start = time.time()
+            wdl, distance = solve(signature, solved, verbose)
+            write_table(path, signature, wdl, distance)
+            if verbose:
+                print(f"  {path} ({time.time() - start:.1f}s)")
+        solved[signature] = (wdl, distance)
+        # As assinaturas de que já nenhuma outra depende podem sair da memória
+        for smaller in [s for s in solved if len(s) < len(signature) - 1]:
+            del solved[smaller]
+
+
+class Tablebase:
+    """
+    Consulta dos ficheiros de um diretório de tablebase. Os ficheiros são
+    abertos (mmap) na primeira consulta de cada assinatura.
+    """
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.paths = {}   # assinatura -> ficheiro
+        self.tables = {}  # assinatura -> (mmap, início dos dados)
+        self.max_pieces = 0
+        self.probes = 0
+        self.hits = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if not name.endswith(EXTENSION):
+                    continue
+                try:
+                    signature = parse_signature(name[:-len(EXTENSION)])
+                except ValueError:
+                    continue
+                self.paths[signature] = os.path.join(directory, name)
+                self.max_pieces = max(self.max_pieces, len(signature))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _open(self, signature):
+        with open(self.paths[signature], "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        n = len(signature)
+        if data[:4] != MAGIC or tuple(data[5:5 + n]) != signature:
+            data.close()
+            raise ValueError(f"Ficheiro de tablebase inválido: {self.paths[signature]}")
+        table = (data, 5 + n)
+        self.tables[signature] = table
+        return table
+
+    def probe(self, pos):
+        """(resultado, distância) para o lado a jogar em `pos`, ou None se não estiver na tablebase."""
+        squares = pos.squares
+        # No meio do jogo sai logo pela contagem de peças, sem montar a assinatura
+        if NUM_PIECES - squares.count(-1) > self.max_pieces:
+            return None
+        signature = tuple(p for p in range(NUM_PIECES) if squares[p] >= 0)
+        if signature not in self.paths:
+            return None
+        self.probes += 1
+        table = self.tables.get(signature)
+        if table is None:
+            table = self._open(signature)
+        data, offset = table
+        index = 0
+        for p in reversed(signature):
+            index = index * NUM_SQUARES + squares[p]
+        code = data[offset + pos.side * NUM_SQUARES ** len(signature) + index]
+        if not code & 3:
+            return None
+        self.hits += 1
+        return code & 3, code >> 2
+
+    def close(self):
+        for data, _ in self.tables.values():
+            data.close()
+        self.tables = {}
+
+
+def open_tablebase(directory=TABLEBASE_DIR):
+    """Tablebase do diretório, ou None se não houver ficheiros."""
+    if not directory:
+        return None
+    tablebase = Tablebase(directory)
+    return tablebase if len(tablebase) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tablebase de finais (análise retrógrada).")
+    parser.add_argument("command", choices=("generate", "probe"))
+    parser.add_argument("position", nargs="?", help="posição a consultar (notação de position.to_notation)")
+    parser.add_argument("--dir", default=TABLEBASE_DIR, help="diretório dos ficheiros")
+    parser.add_argument("--per-side", type=int, default=2, help="peças no máximo de cada lado")
+    parser.add_argument("--max-pieces", type=int, default=3, help="peças no máximo no total")
+    parser.add_argument("--signature", action="append", help="só esta assinatura (p.ex. LR_e); repetível")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        if args.signature:
+            signature_list = [parse_signature(name) for name in args.signature]
+        else:
+            signature_list = signatures(args.per_side, args.max_pieces)
+        start = time.time()
+        generate(signature_list, args.dir)
+        print(f"{len(signature_list)} assinaturas em {time.time() - start:.1f}s")
+        return
+
+    if not args.position:
+        parser.error("probe precisa de uma posição")
+    tablebase = Tablebase(args.dir)
+    entry = tablebase.probe(from_notation(args.position))
+    if entry is None:
+        print("posição fora da tablebase")
+    else:
+        wdl, distance = entry
+        print(f"{('ganha', 'perde', 'empate')[wdl - 1]} (distância {distance} plies)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# tournament.py
+"""
+Torneio IA vs IA sem interação, para testar alterações ao motor.
+
+Exemplo:
+    python tournament.py hard:depth=5 iterative:time=2 --games 20 --workers 4 --output resultados.txt
+
+Cada motor é descrito por "nível[:opção=valor,...]" com nível easy, medium,
+hard (opção depth), iterative (opção time, em segundos) ou mcts (opções time,
+iters, o número de iterações, e leaf=1/batch para a paralelização nas
+folhas); todos aceitam workers (processos por motor), tt
+(tamanho da tabela de transposição em MB), ec (tamanho da cache de avaliações
+em MB, 0 para a desligar), tb=0 (sem tablebase de finais), book=0 (sem
+livro de aberturas) e
+qs/pvs/asp/null/lmr/futility/order=0|1 para
+desligar/ligar técnicas da pesquisa e corrida=N (bónus da avaliação ao lado
+com a peça mais próxima da toca adversária, ver AI.corrida). Os jogos são distribuídos por um
+pool de processos, as cores alternam e cada jogo usa uma semente fixa. Um jogo
+é empate se chegar ao limite de plies ou se a mesma posição se repetir três
+vezes.
+"""
+import argparse
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from minimax import AI, HARD_DEPTH
+from book import BOOK_PATH
+from tablebase import TABLEBASE_DIR
+from position import Position, SIDES, square
+from rules import Rules
+
+LEVELS = ("easy", "medium", "hard", "iterative", "mcts")
+
+
+def parse_engine(spec):
+    """Converte "nível:opção=valor,..." num dicionário de configuração."""
+    level, _, options = spec.partition(":")
+    if level not in LEVELS:
+        raise ValueError(f"Nível desconhecido: {level}")
+    config = {"name": spec, "level": level}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        config[key] = float(value) if key == "time" else int(value)
+    return config
+
+
+# Opções que ligam/desligam técnicas da pesquisa (p.ex. "hard:depth=5,lmr=0")
+SEARCH_OPTIONS = {"qs": "use_quiescence", "pvs": "use_pvs", "asp": "use_aspiration",
+                  "null": "use_null_move", "lmr": "use_lmr", "futility": "use_futility",
+                  "order": "use_static_order"}
+
+
+def make_ai(config):
+    flags = {SEARCH_OPTIONS[key]: bool(value) for key, value in config.items() if key in SEARCH_OPTIONS}
+    return AI(tt_size_mb=config.get("tt", 16), eval_cache_mb=config.get("ec", 4), workers=config.get("workers", 1),
+              tablebase=TABLEBASE_DIR if config.get("tb", 1) else None,
+              book=BOOK_PATH if config.get("book", 1) else None, corrida_bonus=config.get("corrida", 0),
+              verbose=False, **flags)
+
+
+def choose_move(ai, config, board, rules, color):
+    """Mesma escolha de método que main.run_aivai_game, com as opções da configuração."""
+    level = config["level"]
+    if level == "easy":
+        return ai.get_move_easy(board, rules, color)
+    if level == "medium":
+        return ai.get_move_medium(board, rules, color)
+    if level == "hard":
+        return ai.get_move_hard(board, rules, color, depth=config.get("depth", HARD_DEPTH))
+    if level == "mcts":
+        return ai.get_move_mcts(board, rules, color, iterations=config.get("iters"), time_limit=config.get("time"),
+                                parallel="leaf" if config.get("leaf") else "root", batch=config.get("batch", 8))
+    return ai.get_move_hard_iterative(board, rules, color, time_limit=config.get("time", 10))
+
+
+def search_nodes(ai, config):
+    """Nós da última pesquisa (o nível easy não pesquisa)."""
+    return ai.last_stats.nodes if ai.last_stats is not None else 0
+
+
+def play_game(config_yellow, config_magenta, seed, max_plies=300):
+    """
+    Joga um jogo completo. Devolve um dicionário com o vencedor (0 = YELLOW,
+    1 = MAGENTA, None = empate), o motivo, o número de plies, as jogadas e, por
+    lado, o tempo total, o número de jogadas e os nós pesquisados.
+    """
+    random.seed(seed)
+    configs = (config_yellow, config_magenta)
+    ais = (make_ai(config_yellow), make_ai(config_magenta))
+    stats = [{"time": 0.0, "moves": 0, "nodes": 0} for _ in configs]
+    pos = Position()
+    seen = {pos.hash: 1}
+    moves = []
+    winner, reason = None, "max_plies"
+    plies = 0
+
+    while plies < max_plies:
+        side = pos.side
+        legal = pos.legal_moves()
+        if not legal:
+            winner, reason = 1 - side, "immobilization"
+            break
+        board = pos.to_board()
+        start = time.time()
+        move = choose_move(ais[side], configs[side], board, Rules(board), SIDES[side])
+        stats[side]["time"] += time.time() - start
+        stats[side]["moves"] += 1
+        stats[side]["nodes"] += search_nodes(ais[side], configs[side])
+
+        move = (square(*move[0].position), square(*move[1])) if move else None
+        if move not in legal:
+            winner, reason = 1 - side, "illegal_move"
+            break
+        pos.make_move(move)
+        moves.append(move)
+        plies += 1
+        if pos.winner() is not None:
+            winner, reason = pos.winner(), "den"
+            break
+        seen[pos.hash] = seen.get(pos.hash, 0) + 1
+        if seen[pos.hash] >= 3:
+            reason = "repetition"
+            break
+
+    for ai in ais:
+        ai.close()
+    return {"winner": winner, "reason": reason, "plies": plies, "stats": stats, "moves": moves}
+
+
+def _play_pairing(args):
+    engine_a, engine_b, game, seed, max_plies = args
+    # Cores alternadas: nos jogos pares o motor A joga com o Amarelo
+    a_side = game % 2
+    configs = (engine_a, engine_b) if a_side == 0 else (engine_b, engine_a)
+    result = play_game(configs[0], configs[1], seed + game, max_plies)
+    result["a_side"] = a_side
+    return result
+
+
+def elo_difference(wins, draws, losses):
+    """Diferença de Elo (A - B) e intervalo de confiança de 95%."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0, 0.0
+
+    def elo(score):
+        score = min(max(score, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / score - 1)
+
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo(score), elo(score - margin), elo(score + margin)
+
+
+def run_tournament(engine_a, engine_b, games, workers=1, seed=0, max_plies=300):
+    tasks = [(engine_a, engine_b, game, seed, max_plies) for game in range(games)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_play_pairing, tasks))
+    return [_play_pairing(task) for task in tasks]
+
+
+def format_report(engine_a, engine_b, results):
+    wins = sum(1 for r in results if r["winner"] == r["a_side"])
+    losses = sum(1 for r in results if r["winner"] is not None and r["winner"] != r["a_side"])
+    draws = len(results) - wins - losses
+    elo, low, high = elo_difference(wins, draws, losses)
+
+    lines = [
+        f"{engine_a['name']} vs {engine_b['name']}: {len(results)} jogos",
+        f"  V/E/D (A): {wins}/{draws}/{losses}",
+        f"  Elo (A - B): {elo:+.1f}  [{low:+.1f}, {high:+.1f}] (95%)",
+        f"  {'motor':<24}{'nós/s':>12}{'s/jogada':>12}",
+    ]
+    for label, config, is_a in (("A", engine_a, True), ("B", engine_b, False)):
+        total_time = total_moves = total_nodes = 0
+        for r in results:
+            side = r["a_side"] if is_a else 1 - r["a_side"]
+            total_time += r["stats"][side]["time"]
+            total_moves += r["stats"][side]["moves"]
+            total_nodes += r["stats"][side]["nodes"]
+        nps = total_nodes / total_time if total_time else 0.0
+        per_move = total_time / total_moves if total_moves else 0.0
+        lines.append(f"  {label + ' ' + config['name']:<24}{nps:>12.0f}{per_move:>12.3f}")
+    reasons = {}
+    for r in results:
+        reasons[r["reason"]] = reasons.get(r["reason"], 0) + 1
+    lines.append("  fim: " + ", ".join(f"{k}={v}" for k, v in sorted(reasons.items())))
+    lines.append(f"  plies médias: {sum(r['plies'] for r in results) / max(1, len(results)):.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Torneio IA vs IA sem interação.")
+    parser.add_argument("engine_a", help='motor A, p.ex. "hard:depth=5"')
+    parser.add_argument("engine_b", help='motor B, p.ex. "iterative:time=2"')
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="processos para jogos em paralelo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--output", help="ficheiro onde escrever a tabela de resultados")
+    args = parser.parse_args()
+
+    engine_a, engine_b = parse_engine(args.engine_a), parse_engine(args.engine_b)
+    results = run_tournament(engine_a, engine_b, args.games, args.workers, args.seed, args.max_plies)
+    report = format_report(engine_a, engine_b, results)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
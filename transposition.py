@@ -0,0 +1,500 @@
+# transposition.py
+"""
+Tabela de transposição de tamanho fixo (em MB) para a pesquisa da IA.
+
+As entradas vivem em arrays pré-alocados (um array por campo) e estão agrupadas
+em buckets de 2 entradas:
+    - entrada 0: preferência por profundidade (só é substituída por uma pesquisa
+      igual ou mais profunda, ou se for de uma pesquisa antiga)
+    - entrada 1: substituída sempre
+SharedTranspositionTable tem a mesma interface, mas num bloco de memória
+partilhada entre processos (para o Lazy SMP).
+
+EvaluationCache é uma tabela à parte, também de tamanho fixo, só com avaliações
+estáticas (chave -> valor), com substituição pelo algoritmo do relógio.
+
+PositionCache guarda resultados de pesquisas profundas num ficheiro (mmap), para
+serem reaproveitados noutros jogos e noutros processos. Para juntar as caches
+gravadas por várias execuções numa só:
+    python transposition.py merge cache.jpc execucao1.jpc execucao2.jpc
+"""
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+EXACT, LOWER, UPPER = 0, 1, 2
+MOVE_NONE = -1
+
+
+def encode_move(move):
+    """Codifica uma jogada (origem, destino) num inteiro pequeno."""
+    return move[0] * 64 + move[1]
+
+
+def decode_move(code):
+    if code == MOVE_NONE:
+        return None
+    return code >> 6, code & 63
+
+
+class TranspositionTable:
+    # chave (8) + valor (8) + profundidade (2) + flag (1) + jogada (2) + idade (1)
+    ENTRY_BYTES = 22
+
+    def __init__(self, size_mb=16):
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self.mask = buckets - 1
+        n = buckets * 2
+        self.keys = array('Q', [0]) * n
+        self.values = array('d', [0.0]) * n
+        self.depths = array('h', [-1]) * n  # -1 = entrada vazia
+        self.flags = array('B', [0]) * n
+        self.moves = array('h', [MOVE_NONE]) * n
+        self.ages = array('B', [0]) * n
+        self.age = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Marca o início de uma nova pesquisa; as entradas antigas passam a ser substituíveis."""
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        n = len(self.keys)
+        self.keys = array('Q', [0]) * n
+        self.depths = array('h', [-1]) * n
+        self.moves = array('h', [MOVE_NONE]) * n
+        self.age = 0
+        self.reset_stats()
+
+    def _find(self, key):
+        i = (key & self.mask) << 1
+        if self.keys[i] == key and self.depths[i] >= 0:
+            return i
+        if self.keys[i + 1] == key and self.depths[i + 1] >= 0:
+            return i + 1
+        return -1
+
+    def probe(self, key):
+        """Devolve (profundidade, valor, flag, jogada codificada) ou None."""
+        self.probes += 1
+        i = self._find(key)
+        if i < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.ages[i] = self.age
+        return self.depths[i], self.values[i], self.flags[i], self.moves[i]
+
+    def store(self, key, depth, value, flag, move=MOVE_NONE):
+        i = (key & self.mask) << 1
+        keys = self.keys
+        depths = self.depths
+        if (keys[i] == key or depths[i] < 0 or self.ages[i] != self.age
+                or depth >= depths[i]):
+            slot = i
+            if keys[i + 1] == key:
+                depths[i + 1] = -1  # evita ter a mesma posição nas duas entradas
+        else:
+            slot = i + 1
+        if depths[slot] >= 0 and keys[slot] != key:
+            self.collisions += 1
+        if move == MOVE_NONE and keys[slot] == key and depths[slot] >= 0:
+            move = self.moves[slot]  # mantém a melhor jogada já conhecida
+        keys[slot] = key
+        self.values[slot] = value
+        depths[slot] = depth
+        self.flags[slot] = flag
+        self.moves[slot] = move
+        self.ages[slot] = self.age
+        self.stores += 1
+
+    def hashfull(self):
+        """Ocupação (por mil) das primeiras 1000 entradas, com a idade atual."""
+        n = min(1000, len(self.keys))
+        used = sum(1 for i in range(n) if self.depths[i] >= 0 and self.ages[i] == self.age)
+        return used * 1000 // n
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "hashfull": self.hashfull(),
+        }
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Tabela de transposição num bloco de multiprocessing.shared_memory, partilhada
+    por vários processos sem locks.
+
+    Cada entrada ocupa duas palavras de 64 bits: [chave ^ dados, dados]. Uma
+    escrita interrompida por outro processo deixa as duas palavras inconsistentes
+    e a entrada é simplesmente ignorada no probe (verificação por XOR). Os dados
+    estão compactados numa palavra:
+        bits  0-31  valor * VALUE_SCALE (com sinal)
+        bits 32-39  profundidade + 1 (0 = entrada vazia)
+        bits 40-41  flag (EXACT/LOWER/UPPER)
+        bits 42-53  jogada codificada (4095 = nenhuma)
+        bits 54-61  idade
+    O processo que cria a tabela é o dono do bloco; os outros ligam-se pelo nome.
+    """
+    ENTRY_BYTES = 16
+    VALUE_SCALE = 1000
+    VALUE_LIMIT = (1 << 31) - 1
+    NO_MOVE = 0xFFF
+
+    def __init__(self, size_mb=16, name=None):
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self.mask = buckets - 1
+        size = buckets * 2 * self.ENTRY_BYTES
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            # Os processos do pool partilham o resource tracker do dono, que é quem
+            # apaga o bloco no fim
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.size_mb = size_mb
+        self.table = self.shm.buf.cast('Q')
+        self.age = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return (self.mask + 1) * 2
+
+    def new_search(self):
+        """A idade é a mesma em todos os processos; é definida por quem coordena a pesquisa."""
+
+    def clear(self):
+        self.table[:] = array('Q', [0]) * len(self.table)
+        self.reset_stats()
+
+    def _pack(self, depth, value, flag, move):
+        v = int(round(value * self.VALUE_SCALE))
+        v = max(-self.VALUE_LIMIT, min(self.VALUE_LIMIT, v)) & 0xFFFFFFFF
+        if move == MOVE_NONE:
+            move = self.NO_MOVE
+        return v | (depth + 1) << 32 | flag << 40 | move << 42 | self.age << 54
+
+    def _unpack(self, data):
+        """Inverso de _pack: (profundidade, valor, flag, jogada codificada)."""
+        v = data & 0xFFFFFFFF
+        if v >= 1 << 31:
+            v -= 1 << 32
+        move = (data >> 42) & 0xFFF
+        return (((data >> 32) & 0xFF) - 1, v / self.VALUE_SCALE, (data >> 40) & 3,
+                MOVE_NONE if move == self.NO_MOVE else move)
+
+    def probe(self, key):
+        self.probes += 1
+        table = self.table
+        i = (key & self.mask) << 2
+        for j in (i, i + 2):
+            data = table[j + 1]
+            if data and table[j] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag, move=MOVE_NONE):
+        table = self.table
+        i = (key & self.mask) << 2
+        data0 = table[i + 1]
+        key0 = table[i] ^ data0
+        if (not data0 or key0 == key or (data0 >> 54) & 0xFF != self.age
+                or depth >= ((data0 >> 32) & 0xFF) - 1):
+            j = i
+            data1 = table[i + 3]
+            if data1 and table[i + 2] ^ data1 == key:
+                table[i + 3] = 0  # evita ter a mesma posição nas duas entradas
+        else:
+            j = i + 2
+        old = table[j + 1]
+        old_key = table[j] ^ old
+        if old and old_key != key:
+            self.collisions += 1
+        if move == MOVE_NONE and old and old_key == key:
+            move = (old >> 42) & 0xFFF
+            if move == self.NO_MOVE:
+                move = MOVE_NONE
+        data = self._pack(depth, value, flag, move)
+        table[j + 1] = data
+        table[j] = key ^ data
+        self.stores += 1
+
+    def hashfull(self):
+        n = min(1000, len(self))
+        table = self.table
+        used = sum(1 for e in range(n) if table[2 * e + 1] and (table[2 * e + 1] >> 54) & 0xFF == self.age)
+        return used * 1000 // n
+
+    def close(self):
+        """Liga-se do bloco (e apaga-o, se este processo for o dono)."""
+        if self.table is not None:
+            self.table.release()
+            self.table = None
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+
+
+class EvaluationCache:
+    """
+    Cache de avaliações estáticas: chave de 64 bits -> valor, com no máximo
+    `capacity` entradas e substituição pelo algoritmo do relógio (aproximação
+    barata de LRU). As entradas estão num anel; cada uma tem um bit de
+    referência, posto a 1 quando é lida. Com a cache cheia, o ponteiro do
+    relógio avança pelo anel, dá uma segunda oportunidade às entradas com o bit
+    a 1 (passa-o a 0) e substitui a primeira com o bit a 0. A procura é feita
+    num dict (chave -> posição no anel), que em Python é bem mais rápido do que
+    percorrer buckets num array.
+    """
+    # Memória aproximada por entrada (dict + listas do anel)
+    ENTRY_BYTES = 128
+
+    def __init__(self, size_mb=4):
+        self.capacity = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.index = {}
+        self.ring_keys = []
+        self.values = []
+        self.referenced = bytearray(self.capacity)
+        self.hand = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.ring_keys)
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.index = {}
+        self.ring_keys = []
+        self.values = []
+        self.referenced = bytearray(self.capacity)
+        self.hand = 0
+        self.reset_stats()
+
+    def probe(self, key):
+        """Devolve o valor guardado para a chave, ou None."""
+        self.probes += 1
+        i = self.index.get(key)
+        if i is None:
+            return None
+        self.hits += 1
+        self.referenced[i] = 1
+        return self.values[i]
+
+    def store(self, key, value):
+        self.stores += 1
+        index = self.index
+        i = index.get(key)
+        if i is not None:
+            self.values[i] = value
+            return
+        if len(self.ring_keys) < self.capacity:
+            i = len(self.ring_keys)
+            self.ring_keys.append(key)
+            self.values.append(value)
+        else:
+            referenced = self.referenced
+            hand = self.hand
+            while referenced[hand]:
+                referenced[hand] = 0
+                hand = hand + 1 if hand + 1 < self.capacity else 0
+            i = hand
+            self.hand = hand + 1 if hand + 1 < self.capacity else 0
+            del index[self.ring_keys[i]]
+            self.ring_keys[i] = key
+            self.values[i] = value
+            self.evictions += 1
+        index[key] = i
+        self.referenced[i] = 0
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "size": len(self.ring_keys),
+        }
+
+
+class PositionCache(SharedTranspositionTable):
+    """
+    Cache persistente de resultados de pesquisas profundas, num ficheiro aberto
+    com mmap: uma tabela de endereçamento aberto (sondagem linear, até
+    CACHE_PROBES casas) com as entradas de SharedTranspositionTable (duas
+    palavras de 64 bits, verificação por XOR). O ficheiro não é lido nem
+    convertido ao abrir; as páginas são carregadas quando são consultadas e,
+    aberto só para leitura, é partilhado por todos os processos através da
+    cache de páginas do sistema.
+
+    Formato: "JPC1", log2 do número de entradas (uint32), 8 bytes livres, e as
+    entradas. Numa casa ocupada por outra posição fica a entrada mais profunda.
+    """
+    MAGIC = b"JPC1"
+    HEADER = struct.Struct("<4sI8x")
+    CACHE_PROBES = 8
+
+    def __init__(self, path, size_mb=16, writable=False):
+        self.path = path
+        self.writable = writable
+        if not os.path.exists(path):
+            if not writable:
+                raise FileNotFoundError(path)
+            entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+            bits = entries.bit_length() - 1
+            with open(path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, bits))
+                f.truncate(self.HEADER.size + (1 << bits) * self.ENTRY_BYTES)
+        with open(path, "r+b" if writable else "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, bits = self.HEADER.unpack_from(self.data, 0)
+        if magic != self.MAGIC or len(self.data) != self.HEADER.size + (1 << bits) * self.ENTRY_BYTES:
+            self.data.close()
+            raise ValueError(f"Ficheiro de cache inválido: {path}")
+        self.mask = (1 << bits) - 1
+        self.size_mb = len(self.data) / (1024 * 1024)
+        self.view = memoryview(self.data)
+        self.table = self.view[self.HEADER.size:].cast('Q')
+        self.age = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return self.mask + 1
+
+    def probe(self, key):
+        self.probes += 1
+        table = self.table
+        mask = self.mask
+        i = key & mask
+        for _ in range(self.CACHE_PROBES):
+            data = table[2 * i + 1]
+            if not data:
+                break
+            if table[2 * i] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+            i = (i + 1) & mask
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag, move=MOVE_NONE):
+        """Guarda a entrada, a não ser que já exista uma igual ou mais profunda para a mesma posição."""
+        table = self.table
+        mask = self.mask
+        i = key & mask
+        slot = shallowest = -1
+        shallowest_depth = depth
+        for _ in range(self.CACHE_PROBES):
+            data = table[2 * i + 1]
+            if not data or table[2 * i] ^ data == key:
+                if data and ((data >> 32) & 0xFF) - 1 > depth:
+                    return
+                slot = i
+                break
+            stored_depth = ((data >> 32) & 0xFF) - 1
+            if stored_depth < shallowest_depth:
+                shallowest, shallowest_depth = i, stored_depth
+            i = (i + 1) & mask
+        if slot < 0:
+            if shallowest < 0:
+                return  # todas as casas têm pesquisas mais profundas
+            slot = shallowest
+            self.collisions += 1
+        data = self._pack(depth, value, flag, move)
+        table[2 * slot + 1] = data
+        table[2 * slot] = key ^ data
+        self.stores += 1
+
+    def entries(self):
+        """Percorre todas as entradas: (chave, profundidade, valor, flag, jogada codificada)."""
+        table = self.table
+        for i in range(len(self)):
+            data = table[2 * i + 1]
+            if data:
+                yield (table[2 * i] ^ data,) + self._unpack(data)
+
+    def used(self):
+        return sum(1 for i in range(len(self)) if self.table[2 * i + 1])
+
+    def hashfull(self):
+        n = min(1000, len(self))
+        return sum(1 for i in range(n) if self.table[2 * i + 1]) * 1000 // n
+
+    def merge(self, other):
+        """Junta as entradas de outra cache (fica a mais profunda de cada posição). Devolve quantas."""
+        count = 0
+        for key, depth, value, flag, move in other.entries():
+            self.store(key, depth, value, flag, move)
+            count += 1
+        return count
+
+    def flush(self):
+        if self.writable:
+            self.data.flush()
+
+    def close(self):
+        if self.table is not None:
+            self.flush()
+            self.table.release()
+            self.view.release()
+            self.data.close()
+            self.table = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache persistente de posições (PositionCache).")
+    parser.add_argument("command", choices=("merge", "info"))
+    parser.add_argument("target", help="ficheiro da cache (criado pelo merge se não existir)")
+    parser.add_argument("sources", nargs="*", help="caches a juntar ao ficheiro (merge)")
+    parser.add_argument("--size", type=int, default=64, help="tamanho em MB de uma cache nova")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        cache = PositionCache(args.target)
+        used = cache.used()
+        print(f"{args.target}: {len(cache)} entradas, {used} ocupadas ({used / len(cache):.1%})")
+        cache.close()
+        return
+
+    cache = PositionCache(args.target, args.size, writable=True)
+    for path in args.sources:
+        source = PositionCache(path)
+        count = cache.merge(source)
+        source.close()
+        print(f"{path}: {count} entradas")
+    print(f"{args.target}: {cache.used()} entradas ocupadas, {cache.collisions} substituídas")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()